@@ -1,52 +1,35 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import plotly.graph_objs as go
 import datetime
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import PolynomialFeatures
 import numpy as np
-import requests
-from bs4 import BeautifulSoup
 import random
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense
 from sklearn.preprocessing import MinMaxScaler
+from ohlcv_store import get_daily_history
+from market_data import fetch_sector_performance
+from ticker_info import info_field, info_fields
+from providers import get_provider
 
 # Cache data fetching functions to improve performance
 @st.cache_data
 def fetch_stock_data(ticker):
-    stock = yf.Ticker(ticker)
-    data = stock.history(period="3y")  # Fetch last 3 years of data
+    data = get_daily_history(ticker, years=3)  # Last 3 years, topped up from the local store
     return data
 
 @st.cache_data
 def fetch_stock_info(ticker):
-    stock = yf.Ticker(ticker)
-    info = stock.info
-    current_price = info.get('currentPrice', 'N/A')
-    industry = info.get('industry', 'N/A')
-    volume = info.get('regularMarketVolume', 'N/A')
-    beta = info.get('beta', 'N/A')
+    current_price, industry, volume, beta = info_fields(
+        ticker, ['currentPrice', 'industry', 'regularMarketVolume', 'beta'], default='N/A'
+    )
     return current_price, industry, volume, beta
 
-# Scrape real-time news from Yahoo Finance
+# Real-time news from the market-data provider
 def fetch_news(ticker):
-    url = f"https://finance.yahoo.com/quote/{ticker}/news?p={ticker}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
-    
-    news_items = []
-    for item in soup.find_all("li", class_="js-stream-content Pos(r)"):
-        title = item.find("h3").text if item.find("h3") else "No title available"
-        link = item.find("a")["href"] if item.find("a") else "#"
-        if not link.startswith("http"):
-            link = "https://finance.yahoo.com" + link
-        news_items.append({"title": title, "link": link})
-    
+    news_items = get_provider().news(ticker)
     return news_items[:5]  # Return top 5 news articles
 
 # Fallback random financial news and insights
@@ -386,62 +369,37 @@ def calculate_stability_score(beta):
 
 # Fetch Insider Trading Data
 def fetch_insider_trading(ticker):
-    stock = yf.Ticker(ticker)
-    insider = stock.insider_transactions
+    insider = get_provider().insider_transactions(ticker)
     if insider is not None and not insider.empty:
         return insider.head(5)  # Return top 5 insider transactions
     else:
         return None
 
-# Fetch Sector-Wise Performance
-def fetch_sector_performance():
-    sectors = {
-        "Technology": "XLK",
-        "Healthcare": "XLV",
-        "Financials": "XLF",
-        "Consumer Discretionary": "XLY",
-        "Energy": "XLE",
-        "Utilities": "XLU",
-        "Real Estate": "XLRE",
-        "Materials": "XLB",
-        "Industrials": "XLI",
-        "Communication Services": "XLC",
-        "Consumer Staples": "XLP"
-    }
-    sector_performance = {}
-    for sector, ticker in sectors.items():
-        data = yf.Ticker(ticker).history(period="1mo")
-        if not data.empty:
-            performance = (data["Close"][-1] - data["Close"][0]) / data["Close"][0] * 100
-            sector_performance[sector] = round(performance, 2)
-    return sector_performance
-
 # Compare Stocks Side by Side
 def compare_stocks(tickers):
     comparison_data = []
     for ticker in tickers:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        data = stock.history(period="3y")
+        data = get_daily_history(ticker, years=3)
         if not data.empty:
+            current_price, industry, volume, beta = info_fields(
+                ticker, ['currentPrice', 'industry', 'regularMarketVolume', 'beta'], default='N/A'
+            )
             comparison_data.append({
                 "Ticker": ticker,
-                "Current Price": info.get('currentPrice', 'N/A'),
-                "Industry": info.get('industry', 'N/A'),
-                "Volume": info.get('regularMarketVolume', 'N/A'),
-                "Beta": info.get('beta', 'N/A'),
+                "Current Price": current_price,
+                "Industry": industry,
+                "Volume": volume,
+                "Beta": beta,
                 "3Y Growth (%)": (data["Close"][-1] - data["Close"][0]) / data["Close"][0] * 100
             })
     return pd.DataFrame(comparison_data)
 
 # Financial Health Check for Stocks
 def financial_health_check(ticker):
-    stock = yf.Ticker(ticker)
-    info = stock.info
-    profitability = info.get('profitMargins', 0) * 100  # Profitability (%)
-    debt_levels = info.get('debtToEquity', 0)  # Debt to Equity Ratio
-    cash_flow = info.get('operatingCashflow', 0)  # Operating Cash Flow
-    roe = info.get('returnOnEquity', 0) * 100  # Return on Equity (%)
+    profitability = info_field(ticker, 'profitMargins', 0) * 100  # Profitability (%)
+    debt_levels = info_field(ticker, 'debtToEquity', 0)  # Debt to Equity Ratio
+    cash_flow = info_field(ticker, 'operatingCashflow', 0)  # Operating Cash Flow
+    roe = info_field(ticker, 'returnOnEquity', 0) * 100  # Return on Equity (%)
 
     # Calculate Health Score (1-10)
     health_score = (
@@ -677,7 +635,7 @@ def main():
                 st.error("No data available for the given ticker. Please check the ticker symbol.")
             else:
                 future_dates, predictions = predict_stock_prices(data, days, model_type)
-                company_name = yf.Ticker(ticker).info.get("shortName", ticker)
+                company_name = info_field(ticker, "shortName", ticker)
                 current_price, industry, volume, beta = fetch_stock_info(ticker)
                 predicted_price = predictions[0]  # First predicted price
                 sentiment = sentiment_analysis(current_price, predicted_price)
@@ -747,9 +705,13 @@ def main():
 
                 # Sector-Wise Performance
                 st.subheader("📊 Sector-Wise Performance")
-                sector_performance = fetch_sector_performance()
+                sector_result = fetch_sector_performance()
+                sector_performance = sector_result["performance"]
                 if sector_performance:
                     st.write(pd.DataFrame.from_dict(sector_performance, orient="index", columns=["Performance (%)"]))
+                    with st.expander("Fetch timing ⏱️"):
+                        st.write(pd.DataFrame.from_dict(sector_result["timings"], orient="index", columns=["Seconds"]))
+                        st.caption(f"Fetched concurrently in {sector_result['total_seconds']:.2f}s total")
                 else:
                     st.warning("Unable to fetch sector-wise performance data.")
 
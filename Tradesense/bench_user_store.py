@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from serialization import available_codecs, get_codec
+from user_store import SQLiteUserStore, ShardedUserStore, apply_trade, new_user_record
+
+# Load/save timings of the user store backends and formats against user and
+# transaction counts, next to the legacy single users.json blob.
+# Usage: python bench_user_store.py --users 100 1000 --transactions 100 10000
+SYMBOLS = ["AAPL", "TSLA", "NVDA", "META", "GOOGL", "MSFT", "AMZN", "AMD", "INTC", "PYPL"]
+
+def make_users(n_users, n_transactions, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 9, 30)
+    users = {}
+    for u in range(n_users):
+        record = new_user_record(f"pw{u}", f"user{u}@example.com", balance=1e9)
+        record["watchlist"] = rng.sample(SYMBOLS, 3)
+        for t in range(n_transactions):
+            symbol = rng.choice(SYMBOLS)
+            held = record["portfolio"].get(symbol, {}).get("quantity", 0)
+            action = "Sell" if held and rng.random() < 0.4 else "Buy"
+            quantity = rng.randint(1, held) if action == "Sell" else rng.randint(1, 50)
+            price = round(rng.uniform(50, 500), 2)
+            transaction = {
+                "time": (start + timedelta(minutes=t)).strftime("%Y-%m-%d %H:%M:%S"),
+                "symbol": symbol, "action": action, "quantity": quantity, "price": price, "total": price * quantity
+            }
+            apply_trade(record, transaction)
+            record["transactions"].append(transaction)
+        users[f"user{u}"] = record
+    return users
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def bench_legacy(users, directory):
+    path = os.path.join(directory, "users.json")
+    def save():
+        with open(path, "w") as f:
+            json.dump(users, f)
+
+    def load():
+        with open(path, "r") as f:
+            json.load(f)
+
+    save, load = timed(save), timed(load)
+    return {"save_all": save, "load_one": load, "load_all": load, "bytes": os.path.getsize(path)}
+
+def _dir_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def bench_store(make_store, users, probe):
+    store = make_store()
+    save = timed(lambda: [store.create_user(name, record) for name, record in users.items()])
+    if hasattr(store, "flush"):
+        store.flush()
+    # A fresh instance, as a new process would see it
+    load_one = timed(lambda: make_store().get_user(probe))
+    load_all = timed(lambda: make_store().load_all())
+    return {"save_all": save, "load_one": load_one, "load_all": load_all}
+
+def run(n_users, n_transactions):
+    users = make_users(n_users, n_transactions)
+    probe = next(iter(users))
+    rows = []
+    work = tempfile.mkdtemp(prefix="tradesense-bench-")
+    try:
+        rows.append(("users.json (legacy)", bench_legacy(users, work)))
+        db_path = os.path.join(work, "users.db")
+        result = bench_store(lambda: SQLiteUserStore(db_path), users, probe)
+        result["bytes"] = sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+        rows.append(("sqlite", result))
+        for name in available_codecs():
+            directory = os.path.join(work, f"shards-{name}")
+            result = bench_store(lambda: ShardedUserStore(directory, write_delay=0, codec=get_codec(name)), users, probe)
+            result["bytes"] = _dir_size(directory)
+            rows.append((f"file/{name}", result))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(f"\n{n_users} users x {n_transactions} transactions")
+    print(f"{'store':<22}{'save all (s)':>14}{'load one (s)':>14}{'load all (s)':>14}{'size (MB)':>12}")
+    for name, r in rows:
+        print(f"{name:<22}{r['save_all']:>14.3f}{r['load_one']:>14.4f}{r['load_all']:>14.3f}{r['bytes'] / 1e6:>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TradeRiser user store formats.")
+    parser.add_argument("--users", type=int, nargs="+", default=[100])
+    parser.add_argument("--transactions", type=int, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+    for n_users in args.users:
+        for n_transactions in args.transactions:
+            run(n_users, n_transactions)
+
+if __name__ == "__main__":
+    main()
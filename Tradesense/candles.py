@@ -0,0 +1,102 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Candles kept per live chart (a full 1-minute session is ~390)
+CANDLE_DEPTH = int(os.environ.get("TRADESENSE_CANDLE_DEPTH", "5000"))
+CANDLE_FIELDS = ("open", "high", "low", "close")
+
+# Fixed-capacity OHLC ring buffer backed by numpy arrays.
+# Every value is written twice, `capacity` slots apart, so the newest `len`
+# candles are always one contiguous slice: appends are O(1) and charting
+# reads are zero-copy views.
+class CandleRing:
+    def __init__(self, capacity=CANDLE_DEPTH):
+        self.capacity = capacity
+        self._time = np.empty(2 * capacity, dtype="datetime64[ns]")
+        self._ohlc = np.empty((4, 2 * capacity), dtype=np.float64)
+        self._next = 0  # slot the next candle goes into, in [0, capacity)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def empty(self):
+        return self._len == 0
+
+    def clear(self):
+        self._next = 0
+        self._len = 0
+
+    def append(self, time, open, high, low, close):
+        i = self._next
+        t = np.datetime64(time, "ns")
+        self._time[i] = t
+        self._time[i + self.capacity] = t
+        self._ohlc[:, i] = (open, high, low, close)
+        self._ohlc[:, i + self.capacity] = (open, high, low, close)
+        self._next = (i + 1) % self.capacity
+        self._len = min(self._len + 1, self.capacity)
+
+    # Append tick dicts with time/open/high/low/close keys
+    def extend(self, ticks):
+        for tick in ticks:
+            self.append(tick["time"], tick["open"], tick["high"], tick["low"], tick["close"])
+
+    # Fold tick candles into bars `width` (a numpy timedelta64) wide. A tick inside
+    # the newest bar widens its high/low and moves its close; a later tick opens a
+    # new bar on the same grid as the newest one.
+    def fold(self, ticks, width):
+        for tick in ticks:
+            t = np.datetime64(tick["time"], "ns")
+            if self._len == 0:
+                self.append(t, tick["open"], tick["high"], tick["low"], tick["close"])
+                continue
+            i = (self._next - 1) % self.capacity
+            start = self._time[i]
+            if t < start + width:
+                high = max(self._ohlc[1, i], tick["high"])
+                low = min(self._ohlc[2, i], tick["low"])
+                for j in (i, i + self.capacity):
+                    self._ohlc[1:, j] = (high, low, tick["close"])
+            else:
+                self.append(start + (t - start) // width * width, tick["open"], tick["high"], tick["low"], tick["close"])
+
+    # Load the newest rows of a frame with time/open/high/low/close columns
+    def extend_frame(self, df):
+        if df.empty:
+            return
+        df = df.tail(self.capacity)
+        times = pd.to_datetime(df["time"])
+        if times.dt.tz is not None:
+            times = times.dt.tz_convert(datetime.now().astimezone().tzinfo).dt.tz_localize(None)
+        for t, o, h, l, c in zip(times.to_numpy(), df["open"].to_numpy(), df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy()):
+            self.append(t, o, h, l, c)
+
+    def _window(self, n=None):
+        n = self._len if n is None else min(n, self._len)
+        end = self._next + self.capacity
+        return end - n, end
+
+    # Zero-copy views of the newest `n` candles (all if n is None)
+    def times(self, n=None):
+        start, end = self._window(n)
+        return self._time[start:end]
+
+    def column(self, field, n=None):
+        start, end = self._window(n)
+        return self._ohlc[CANDLE_FIELDS.index(field), start:end]
+
+    def last(self, field):
+        if self._len == 0:
+            raise IndexError("no candles")
+        return float(self._ohlc[CANDLE_FIELDS.index(field), (self._next - 1) % self.capacity])
+
+    # Copy out as a DataFrame, for tables and exports
+    def to_frame(self, n=None):
+        data = {"time": self.times(n)}
+        for field in CANDLE_FIELDS:
+            data[field] = self.column(field, n)
+        return pd.DataFrame(data)
@@ -0,0 +1,128 @@
+import atexit
+import io
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from fileutil import atomic_write
+
+# One .npz file of equity samples per user
+EQUITY_DIR = os.environ.get("TRADESENSE_EQUITY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "equity"))
+
+# (name, bucket seconds, retention seconds or None to keep forever), finest first.
+# A year of history is ~2.9k minute + ~2.2k hour + 365 day points.
+TIERS = (
+    ("minute", 60, 2 * 86400),
+    ("hour", 3600, 90 * 86400),
+    ("day", 86400, None),
+)
+
+def _bucket(ts, seconds):
+    # Day buckets start at local midnight, not UTC midnight
+    offset = time.localtime(ts).tm_gmtoff if seconds >= 86400 else 0
+    return int((ts + offset) // seconds * seconds - offset)
+
+# Fixed-resolution equity curve. Each sample updates the current bucket of every
+# tier (the last value in a bucket wins), so tiers are downsampled as they are
+# written and never need a rollup pass. Old minute and hour points are trimmed
+# once they fall out of retention; day points are kept.
+class EquityCurve:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tiers = {name: (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)) for name, _, _ in TIERS}
+        self._dirty = False
+        try:
+            with np.load(path) as data:
+                for name, _, _ in TIERS:
+                    self._tiers[name] = (data[f"{name}_t"].astype(np.int64), data[f"{name}_v"].astype(np.float64))
+        except (OSError, KeyError, ValueError):
+            pass
+
+    # Record total equity now. The file is rewritten at most once per minute,
+    # when a new minute bucket opens.
+    def record(self, value, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            times, _ = self._tiers["minute"]
+            new_minute = not len(times) or _bucket(now, 60) > times[-1]
+            for name, seconds, retention in TIERS:
+                times, values = self._tiers[name]
+                bucket = _bucket(now, seconds)
+                if len(times) and times[-1] == bucket:
+                    values[-1] = value
+                else:
+                    times = np.append(times, bucket)
+                    values = np.append(values, value)
+                if retention is not None:
+                    keep = times >= now - retention
+                    if not keep[0]:
+                        times, values = times[keep], values[keep]
+                self._tiers[name] = (times, values)
+            self._dirty = True
+            if new_minute:
+                self._save()
+
+    # Caller holds self._lock
+    def _save(self):
+        arrays = {}
+        for name, (times, values) in self._tiers.items():
+            arrays[f"{name}_t"] = times
+            arrays[f"{name}_v"] = values
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        atomic_write(self.path, buffer.getvalue())
+        self._dirty = False
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    # Points between start and end (epoch seconds) from the finest tier that
+    # still covers `start`, as a DataFrame of local times and values
+    def range(self, start=None, end=None):
+        now = time.time()
+        with self._lock:
+            for name, _, retention in TIERS:
+                times, values = self._tiers[name]
+                if retention is None or (start is not None and start >= now - retention):
+                    break
+            lo = 0 if start is None else np.searchsorted(times, start, side="left")
+            hi = len(times) if end is None else np.searchsorted(times, end, side="right")
+            times, values = times[lo:hi].copy(), values[lo:hi].copy()
+        local = pd.to_datetime(times, unit="s", utc=True).tz_convert(datetime.now().astimezone().tzinfo).tz_localize(None)
+        return pd.DataFrame({"time": local, "value": values})
+
+    def stats(self):
+        with self._lock:
+            return {name: len(times) for name, (times, _) in self._tiers.items()}
+
+_curves = {}
+_curves_lock = threading.Lock()
+
+def _path(username):
+    return os.path.join(EQUITY_DIR, quote(username, safe="") + ".npz")
+
+def get_equity_curve(username):
+    with _curves_lock:
+        if username not in _curves:
+            _curves[username] = EquityCurve(_path(username))
+        return _curves[username]
+
+# Persist samples recorded since each curve's last minute-boundary save
+@atexit.register
+def flush_all():
+    with _curves_lock:
+        curves = list(_curves.values())
+    for curve in curves:
+        curve.flush()
+
+def record_equity(username, value, now=None):
+    get_equity_curve(username).record(value, now)
+
+def equity_history(username, start=None, end=None):
+    return get_equity_curve(username).range(start, end)
@@ -0,0 +1,25 @@
+import os
+import threading
+
+# Write `data` (bytes, or str as UTF-8) to `path` atomically: it goes to a temp
+# file unique to this process and thread, then is renamed over `path`, so a
+# concurrent reader sees either the old file or the new one, never half of it.
+# With durable=True the temp file is fsynced before the rename.
+def atomic_write(path, data, durable=False):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,36 +1,37 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
-import json
-import os
 import time
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import random
-
-# User data file
-USER_DATA_FILE = "users.json"
+from market_data import fetch_history, download_bars, symbol_bars, field_matrix
+from ticker_info import info_field, info_fields, company_name as cached_company_name
+from quotes import get_quote, get_quotes, quote_age
+from providers import get_provider
+from prefetch import start_prefetcher
+from price_bus import subscribe
+from candles import CandleRing
+from resample import CHART_INTERVALS, RESAMPLE_RULES, can_resample, get_bars
+from user_store import get_user_store, new_user_record, apply_trade
+from valuation import position_arrays, price_vector, value_positions
+from equity_curve import record_equity, equity_history
+from risk import HORIZONS, portfolio_risk
+from tax_lots import LOT_METHODS, LotBook, new_lot_state
+from optimizer import optimize_portfolio
+
+# Fixed symbol lists for the Market Movers and Recent Data pages
+MOVERS_SYMBOLS = ["AAPL", "TSLA", "NVDA", "META", "GOOGL", "MSFT", "AMZN", "AMD", "INTC", "PYPL"]
+RECENT_DATA_SYMBOLS = ["AAPL", "TSLA", "GOOGL", "MSFT", "AMZN", "NVDA", "META", "AMD", "INTC", "PYPL"]
 
 # Email configuration (Replace with your email and password)
 EMAIL_ADDRESS = "tradesense2003@gmail.com"  # Replace with your Gmail email
 EMAIL_PASSWORD = "bows negp rtlt ngqs"  # Replace with your Gmail app-specific password
 
-# Load/save users
-def load_users():
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    with open(USER_DATA_FILE, 'w') as f:
-        json.dump(users, f)
-
 # Send email function
 def send_email(to_email, subject, body):
     try:
@@ -55,17 +56,16 @@ def initialize_session_state():
         'logged_in': False,
         'username': "",
         'email': "",
-        'users': load_users(),
-        'candle_data': pd.DataFrame(columns=["time", "open", "high", "low", "close"]),
+        'user_data': None,
+        'candle_data': CandleRing(),
         'trading_active': False,
+        'price_subscription': None,
         'symbol': "AAPL",
+        'chart_interval': "1m",
         'last_price': {},
         'sold_price': {},
         'bought_price': {},
         'last_update_time': 0,
-        'stock_data_cache': {},
-        'company_name_cache': {},
-        'portfolio_history': [],
         'current_price': 0.0,
         'market_news': [],
         'market_movers': {"gainers": []},
@@ -94,15 +94,14 @@ def preload_data():
         st.session_state.market_news = fetch_market_news()
         st.session_state.market_movers = fetch_market_movers()
 
-# Fetch stock data from yfinance with caching
+# Fetch stock data from the data provider through the process-wide history cache.
+# Coarser intraday intervals are resampled from the cached 1-minute series.
 def get_stock_data(symbol, period="1d", interval="1m"):
-    cache_key = f"{symbol}_{period}_{interval}"
-    if cache_key in st.session_state.stock_data_cache:
-        return st.session_state.stock_data_cache[cache_key]
-
     try:
-        stock = yf.Ticker(symbol)
-        df = stock.history(period=period, interval=interval)
+        if can_resample(period, interval):
+            df = get_bars(symbol, interval=interval, period=period)
+        else:
+            df = fetch_history(symbol, period=period, interval=interval)
         if df.empty:
             df = pd.DataFrame([{
                 "time": datetime.now(),
@@ -113,7 +112,6 @@ def get_stock_data(symbol, period="1d", interval="1m"):
             }])
         else:
             df = df.reset_index().rename(columns={"Datetime": "time", "Open": "open", "High": "high", "Low": "low", "Close": "close"})
-        st.session_state.stock_data_cache[cache_key] = df
         return df
     except Exception:
         return pd.DataFrame([{
@@ -124,33 +122,29 @@ def get_stock_data(symbol, period="1d", interval="1m"):
             "close": 100.2
         }])
 
-# Fetch company name with caching
+# Fetch company name from the shared metadata cache
 def get_company_name(symbol):
-    if symbol in st.session_state.company_name_cache:
-        return st.session_state.company_name_cache[symbol]
-
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        company_name = info.get("longName", "Unknown Company")
-        st.session_state.company_name_cache[symbol] = company_name
-        return company_name
+        return cached_company_name(symbol)
     except Exception:
-        st.session_state.company_name_cache[symbol] = "Unknown Company"
         return "Unknown Company"
 
-# Fetch current price for a symbol
+# The signed-in user's tax lots. The store loads the lot state with the user
+# record and apply_trade keeps it current, so no trade history is replayed.
+def get_lot_book():
+    return LotBook(st.session_state.user_data.setdefault("lots", new_lot_state()))
+
+# Fetch current price for a symbol from the shared quote engine
 def get_current_price(symbol):
     try:
-        stock = yf.Ticker(symbol)
-        data = stock.history(period="1d", interval="1m")
-        if not data.empty:
-            return round(data["Close"][-1], 2)
+        price = get_quote(symbol)
+        if price is not None:
+            return round(price, 2)
         return 0.0
     except Exception:
         return 0.0
 
-# Fetch market news using yfinance or random fallback
+# Fetch market news from the data provider or random fallback
 def fetch_market_news():
     news_options = [
         "Tech stocks rally as AI demand surges. 🚀",
@@ -165,8 +159,7 @@ def fetch_market_news():
         "Automakers pivot to EVs, boosting shares. 🚗"
     ]
     try:
-        sp500 = yf.Ticker("^GSPC")
-        news = sp500.news[:5]
+        news = get_provider().news("^GSPC")[:5]
         news_items = [item["title"] for item in news]
         if not news_items:
             return random.sample(news_options, 5)
@@ -174,50 +167,49 @@ def fetch_market_news():
     except Exception:
         return random.sample(news_options, 5)
 
-# Fetch market movers (only Top Gainers) with optimization
+# Fetch market movers (only Top Gainers) from one batched download
 def fetch_market_movers():
-    symbols = ["AAPL", "TSLA", "NVDA", "META", "GOOGL", "MSFT", "AMZN", "AMD", "INTC", "PYPL"]
+    symbols = MOVERS_SYMBOLS
     gainers = []
-    for symbol in symbols:
-        try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="1d")
-            if not data.empty:
-                change = ((data["Close"][-1] - data["Open"][0]) / data["Open"][0]) * 100
-                change = round(change, 2)
-                if change >= 0:
-                    gainers.append({"symbol": symbol, "change": change})
-        except Exception:
-            continue
-    gainers = sorted(gainers, key=lambda x: x["change"], reverse=True)[:5]
+    bars = download_bars(symbols, period="1d", interval="1d")
+    if not bars.empty:
+        opens = field_matrix(bars, "Open").bfill().iloc[0]
+        closes = field_matrix(bars, "Close").ffill().iloc[-1]
+        changes = ((closes - opens) / opens * 100).round(2).dropna()
+        gainers = [
+            {"symbol": symbol, "change": float(change)}
+            for symbol, change in changes[changes >= 0].sort_values(ascending=False).head(5).items()
+        ]
     if not gainers:
         gainers = [{"symbol": f"GAINER{i}", "change": 3.5 - i*0.2} for i in range(5)]
     return {"gainers": gainers}
 
-# Fetch recent data for selected stocks with optimization
+# Fetch recent data for selected stocks from one batched download
 def fetch_recent_data():
-    symbols = ["AAPL", "TSLA", "GOOGL", "MSFT", "AMZN", "NVDA", "META", "AMD", "INTC", "PYPL"]
+    symbols = RECENT_DATA_SYMBOLS
+    bars = download_bars(symbols, period="1d", interval="1m")
     data_list = []
     for symbol in symbols:
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="1d", interval="1m")
-            info = stock.info
+            data = symbol_bars(bars, symbol)
             if not data.empty:
+                high_52w, low_52w, market_cap, pe_ratio, dividend_yield, eps = info_fields(
+                    symbol, ["fiftyTwoWeekHigh", "fiftyTwoWeekLow", "marketCap", "trailingPE", "dividendYield", "trailingEps"], default=0
+                )
                 latest = data.iloc[-1]
                 change = ((latest["Close"] - data.iloc[0]["Open"]) / data.iloc[0]["Open"]) * 100
                 data_list.append({
                     "Symbol": symbol,
-                    "Company": info.get("longName", "Unknown Company"),
+                    "Company": info_field(symbol, "longName", "Unknown Company"),
                     "Price": round(latest["Close"], 2),
                     "Volume": int(latest["Volume"]),
                     "Change %": round(change, 2),
-                    "52w high": round(info.get("fiftyTwoWeekHigh", 0), 2),
-                    "52w low": round(info.get("fiftyTwoWeekLow", 0), 2),
-                    "Market cap (B)": round(info.get("marketCap", 0) / 1e9, 2),
-                    "P/e ratio": round(info.get("trailingPE", 0), 2),
-                    "Dividend yield": round(info.get("dividendYield", 0) * 100, 2) if info.get("dividendYield") else 0.0,
-                    "Eps": round(info.get("trailingEps", 0), 2)
+                    "52w high": round(high_52w, 2),
+                    "52w low": round(low_52w, 2),
+                    "Market cap (B)": round(market_cap / 1e9, 2),
+                    "P/e ratio": round(pe_ratio, 2),
+                    "Dividend yield": round(dividend_yield * 100, 2),
+                    "Eps": round(eps, 2)
                 })
         except Exception:
             data_list.append({
@@ -237,24 +229,23 @@ def fetch_recent_data():
     df.index = range(1, len(df) + 1)
     return df
 
-# Fetch watchlist data with real-time updates
+# Fetch watchlist data from one batched download
 def fetch_watchlist_data(symbols):
+    bars = download_bars(symbols, period="1d", interval="1m")
     data_list = []
     for symbol in symbols:
         try:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period="1d", interval="1m")
-            info = stock.info
+            data = symbol_bars(bars, symbol)
             if not data.empty:
                 latest = data.iloc[-1]
                 data_list.append({
                     "Ticker symbol": symbol,
-                    "Company name": info.get("longName", "Unknown Company"),
+                    "Company name": info_field(symbol, "longName", "Unknown Company"),
                     "Price": round(latest["Close"], 2),
                     "Volume": int(latest["Volume"]),
-                    "Industry": info.get("industry", "N/A"),
-                    "Market cap": round(info.get("marketCap", 0) / 1e9, 2),
-                    "P/e ratio": round(info.get("trailingPE", 0), 2)
+                    "Industry": info_field(symbol, "industry", "N/A"),
+                    "Market cap": round(info_field(symbol, "marketCap", 0) / 1e9, 2),
+                    "P/e ratio": round(info_field(symbol, "trailingPE", 0), 2)
                 })
         except Exception:
             data_list.append({
@@ -270,33 +261,33 @@ def fetch_watchlist_data(symbols):
     df.index = range(1, len(df) + 1)
     return df
 
-# Simulate real-time candle updates
-def update_candle_data(symbol):
-    data = get_stock_data(symbol, period="1d", interval="1m")
-    if not data.empty:
-        latest_candle = data.iloc[-1]
-        volatility = (data["high"].max() - data["low"].min()) * 0.05 or 0.5
-        new_open = st.session_state.last_price.get(symbol, latest_candle["close"])
+# Subscribe this session to the shared price bus for a symbol
+def get_price_subscription(symbol):
+    sub = st.session_state.price_subscription
+    if sub is not None and (sub.symbol != symbol or sub.closed):
+        sub.close()
+        sub = None
+    if sub is None:
+        sub = subscribe(symbol)
+        st.session_state.price_subscription = sub
+    return sub
+
+def close_price_subscription():
+    if st.session_state.price_subscription is not None:
+        st.session_state.price_subscription.close()
+        st.session_state.price_subscription = None
+
+# Add the simulated candles published on the symbol's price bus. On 1m they are
+# appended as they arrive; coarser intervals fold them into the current bar.
+def update_candle_data(symbol, interval="1m"):
+    ticks = get_price_subscription(symbol).next_ticks(timeout=2.0)
+    if not ticks:
+        return
+    if interval in RESAMPLE_RULES:
+        st.session_state.candle_data.fold(ticks, pd.Timedelta(RESAMPLE_RULES[interval]).to_timedelta64())
     else:
-        new_open = st.session_state.last_price.get(symbol, 100.0)
-        volatility = 0.5
-
-    new_high = new_open + np.random.uniform(0, volatility)
-    new_low = new_open - np.random.uniform(0, volatility)
-    new_close = new_open + np.random.uniform(-volatility * 0.3, volatility * 0.3)
-    
-    new_candle = {
-        "time": datetime.now(),
-        "open": new_open,
-        "high": new_high,
-        "low": new_low,
-        "close": new_close
-    }
-    st.session_state.candle_data = pd.concat(
-        [st.session_state.candle_data, pd.DataFrame([new_candle])], ignore_index=True
-    )
-    if len(st.session_state.candle_data) > 15:
-        st.session_state.candle_data = st.session_state.candle_data.iloc[-15:]
+        st.session_state.candle_data.extend(ticks)
+    new_close = ticks[-1]["close"]
     st.session_state.last_price[symbol] = new_close
     st.session_state.current_price = new_close
 
@@ -304,17 +295,18 @@ def update_candle_data(symbol):
 def check_price_alerts():
     if not st.session_state.logged_in:
         return
-    user_data = st.session_state.users.get(st.session_state.username, {})
+    user_data = st.session_state.user_data
     if not user_data:
         return
     email = user_data.get("email", "")
     if not email:
         return
     alerts_to_remove = []
+    quotes = get_quotes([alert.get("symbol", "") for alert in st.session_state.price_alerts])
     for alert in st.session_state.price_alerts:
         symbol = alert.get("symbol", "")
         target_price = alert.get("target_price", 0.0)
-        current_price = st.session_state.last_price.get(symbol, get_current_price(symbol))
+        current_price = st.session_state.last_price.get(symbol, quotes.get(symbol, 0.0))
         if current_price >= target_price:
             alert_message = f"Price Alert! 📢 {symbol} has reached ${current_price:.2f} (Target: ${target_price:.2f}) 🎯"
             st.session_state.alert_message = alert_message
@@ -334,10 +326,12 @@ The TradeRiser Team 🌟
 """
             send_email(email, subject, body)
             alerts_to_remove.append(alert)
+    if not alerts_to_remove:
+        return
     for alert in alerts_to_remove:
         st.session_state.price_alerts.remove(alert)
     user_data["price_alerts"] = st.session_state.price_alerts
-    save_users(st.session_state.users)
+    get_user_store().set_price_alerts(st.session_state.username, st.session_state.price_alerts)
 
 # Login Page
 def login():
@@ -853,12 +847,13 @@ def login():
     st.markdown('</div>', unsafe_allow_html=True)
 
     if login_btn:
-        users = st.session_state.users
-        if username in users and users[username]["password"] == password:
+        user_data = get_user_store().authenticate(username, password)
+        if user_data is not None:
+            st.session_state.user_data = user_data
             st.session_state.logged_in = True
             st.session_state.username = username
-            st.session_state.email = users[username]["email"]
-            st.session_state.price_alerts = users[username].get("price_alerts", [])
+            st.session_state.email = user_data["email"]
+            st.session_state.price_alerts = user_data.get("price_alerts", [])
             st.success("Welcome back, trader! 🚀")
             st.rerun()
         else:
@@ -995,25 +990,18 @@ def register():
     st.markdown('</div>', unsafe_allow_html=True)
 
     if register_btn:
-        users = st.session_state.users
-        if username in users:
+        if get_user_store().user_exists(username):
             st.error("Username already exists! 🚫")
         elif password != confirm_password:
             st.error("Passwords do not match! ⚠️")
         elif not email:
             st.error("Please provide an email address! 📧")
         else:
-            users[username] = {
-                "password": password,
-                "email": email,
-                "balance": 10000.0,
-                "portfolio": {},
-                "watchlist": [],
-                "transactions": [],
-                "price_alerts": []
-            }
-            save_users(users)
-            st.session_state.users = users
+            record = new_user_record(password, email)
+            if not get_user_store().create_user(username, record):
+                st.error("Username already exists! 🚫")
+                return
+            st.session_state.user_data = record
             st.session_state.logged_in = True
             st.session_state.username = username
             st.session_state.email = email
@@ -1044,9 +1032,11 @@ The TradeRiser Team 🌟
 def logout():
     st.session_state.logged_in = False
     st.session_state.username = ""
+    st.session_state.user_data = None
     st.session_state.email = ""
     st.session_state.trading_active = False
-    st.session_state.candle_data = pd.DataFrame(columns=["time", "open", "high", "low", "close"])
+    close_price_subscription()
+    st.session_state.candle_data.clear()
     st.session_state.last_update_time = 0
     st.session_state.price_alerts = []
     st.session_state.alert_popup = False
@@ -1062,47 +1052,48 @@ def logout():
     st.rerun()
 
 # Calculate portfolio stats
+# One bulk quote lookup, then a vectorized valuation of every holding.
+# Live chart prices from this session override the shared quotes.
 def calculate_portfolio_stats(user_data):
-    portfolio_value = 0.0
-    total_shares = 0
-    total_assets = 0
-    net_profit_loss = 0.0
-    breakdown = []
-
-    for symbol, details in user_data.get("portfolio", {}).items():
-        current_price = st.session_state.last_price.get(symbol, get_current_price(symbol))
-        asset_value = round(current_price * details["quantity"], 2)
-        portfolio_value += asset_value
-        total_shares += details["quantity"]
-        total_assets += 1
-        asset_profit_loss = round((current_price - details["avg_price"]) * details["quantity"], 2)
-        net_profit_loss += asset_profit_loss
-        breakdown.append({
+    symbols, quantities, avg_prices = position_arrays(user_data.get("portfolio", {}))
+    prices = price_vector(symbols, get_quotes(symbols), st.session_state.last_price)
+    valuation = value_positions(quantities, avg_prices, prices, cash=user_data["balance"])
+    portfolio_value = valuation["invested"]
+
+    values = np.round(valuation["values"], 2)
+    profit_loss = np.round(valuation["pnl"], 2)
+    breakdown = [
+        {
             "Symbol": symbol,
-            "Quantity": details["quantity"],
-            "Avg price": details["avg_price"],
-            "Current price": current_price,
-            "Value": asset_value,
-            "Profit/loss": asset_profit_loss
-        })
+            "Quantity": int(quantity),
+            "Avg price": avg_price,
+            "Current price": price,
+            "Value": value,
+            "Profit/loss": pl,
+            "Weight": f"{weight:.1%}",
+            "Exposure": f"{exposure:.1%}"
+        }
+        for symbol, quantity, avg_price, price, value, pl, weight, exposure in zip(
+            symbols, quantities.tolist(), avg_prices.tolist(), prices.tolist(), values.tolist(),
+            profit_loss.tolist(), valuation["weights"].tolist(), valuation["exposure"].tolist()
+        )
+    ]
 
-    st.session_state.portfolio_history.append({"time": datetime.now(), "value": portfolio_value + user_data["balance"]})
-    if len(st.session_state.portfolio_history) > 50:
-        st.session_state.portfolio_history = st.session_state.portfolio_history[-50:]
+    record_equity(st.session_state.username, valuation["equity"])
 
     return {
         "portfolio_value": portfolio_value,
         "cash_balance": user_data["balance"],
-        "total_shares": total_shares,
-        "total_assets": total_assets,
-        "net_profit_loss": net_profit_loss,
+        "total_shares": int(quantities.sum()),
+        "total_assets": len(symbols),
+        "net_profit_loss": float(profit_loss.sum()),
+        "gross_exposure": valuation["gross_exposure"],
         "breakdown": breakdown
     }
 
 # Main App
 def main_app():
-    users = st.session_state.users
-    user_data = users.get(st.session_state.username, {})
+    user_data = st.session_state.user_data
     if not user_data:
         st.error("User data not found. Please log in again.")
         return
@@ -1421,8 +1412,7 @@ def main_app():
 
         # Additional Content: Quick Info Cards
         current_price = st.session_state.current_price if st.session_state.current_price > 0 else get_current_price(symbol)
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        high_52w, low_52w, market_cap = info_fields(symbol, ["fiftyTwoWeekHigh", "fiftyTwoWeekLow", "marketCap"], default=0)
         st.markdown("""
             <div class="dashboard-info">
                 <div class="info-card">
@@ -1444,32 +1434,44 @@ def main_app():
             </div>
         """.format(
             current_price,
-            info.get("fiftyTwoWeekHigh", 0),
-            info.get("fiftyTwoWeekLow", 0),
-            info.get("marketCap", 0) / 1e9
+            high_52w,
+            low_52w,
+            market_cap / 1e9
         ), unsafe_allow_html=True)
 
+        chart_interval = st.selectbox("Chart interval ⏱️", CHART_INTERVALS, index=CHART_INTERVALS.index(st.session_state.chart_interval))
         col1, col2 = st.columns(2)
         with col1:
             start_trading = st.button("Start Trading 🚀")
         with col2:
             stop_trading = st.button("Stop Trading 🛑")
 
+        # Reseed the chart history when the interval changes
+        if chart_interval != st.session_state.chart_interval:
+            st.session_state.chart_interval = chart_interval
+            if not st.session_state.candle_data.empty:
+                st.session_state.candle_data.clear()
+                st.session_state.candle_data.extend_frame(get_stock_data(symbol, period="5d", interval=chart_interval))
+
         if start_trading:
             st.session_state.trading_active = True
-            data = get_stock_data(symbol)
-            st.session_state.candle_data = data[-15:]
-            st.session_state.last_price[symbol] = st.session_state.candle_data.iloc[-1]["close"]
+            data = get_stock_data(symbol, period="5d", interval=chart_interval)
+            st.session_state.candle_data.clear()
+            st.session_state.candle_data.extend_frame(data)
+            st.session_state.last_price[symbol] = st.session_state.candle_data.last("close")
             st.session_state.current_price = st.session_state.last_price[symbol]
             st.session_state.last_update_time = time.time()
 
         if stop_trading:
             st.session_state.trading_active = False
+            close_price_subscription()
 
         # Trade Summary
         bought_price = st.session_state.bought_price.get(symbol, 0.0)
         sold_price = st.session_state.sold_price.get(symbol, 0.0)
-        profit_loss = (sold_price - bought_price) if sold_price > 0 else 0.0
+        lot_book = get_lot_book()
+        realized_pl = lot_book.realized.get(symbol, 0.0)
+        unrealized_pl = lot_book.unrealized({symbol: current_price}).get(symbol, 0.0)
         available_stocks = user_data["portfolio"].get(symbol, {"quantity": 0})["quantity"]
         st.markdown(f"""
             <div class="glass">
@@ -1477,7 +1479,8 @@ def main_app():
                 <p>Bought price 🛒: ${bought_price:.2f}</p>
                 <p>Current price 📊: ${current_price:.2f}</p>
                 <p>Sold price 🏷️: ${sold_price:.2f}</p>
-                <p>Profit/loss 📈: <span style="color: {'#00ff00' if profit_loss >= 0 else '#ff0000'}">${profit_loss:.2f}</span></p>
+                <p>Realized p/l 📈: <span style="color: {'#00ff00' if realized_pl >= 0 else '#ff0000'}">${realized_pl:.2f}</span></p>
+                <p>Unrealized p/l 📊: <span style="color: {'#00ff00' if unrealized_pl >= 0 else '#ff0000'}">${unrealized_pl:.2f}</span></p>
                 <h4>Available stocks 📜</h4>
                 <p>{symbol}: {available_stocks} shares</p>
             </div>
@@ -1486,6 +1489,14 @@ def main_app():
         # Buy/Sell
         st.markdown('<div class="glass"><h3>Trade 🛠️</h3>', unsafe_allow_html=True)
         quantity = st.number_input("Quantity 🔢", min_value=1, value=1, key="trade_qty")
+        lot_method = st.radio("Lots to sell 🧾", LOT_METHODS, horizontal=True, key="lot_method")
+        chosen_lots = []
+        if lot_method == "Specific lots":
+            open_lots = {
+                f"#{lot['lot']}: {lot['quantity']} @ ${lot['price']:.2f} ({lot['time']})": lot["lot"]
+                for lot in lot_book.open_lots(symbol)
+            }
+            chosen_lots = [open_lots[label] for label in st.multiselect("Sell from lots", list(open_lots), key="sell_lots")]
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Buy 🟢", key="buy_btn"):
@@ -1494,25 +1505,15 @@ def main_app():
                     st.error("Cannot buy: Current price is zero! 🚫")
                 else:
                     total_cost = price * quantity
-                    if total_cost <= user_data["balance"]:
-                        user_data["balance"] -= total_cost
-                        if symbol in user_data["portfolio"]:
-                            current_qty = user_data["portfolio"][symbol]["quantity"]
-                            current_avg = user_data["portfolio"][symbol]["avg_price"]
-                            user_data["portfolio"][symbol]["quantity"] += quantity
-                            user_data["portfolio"][symbol]["avg_price"] = (
-                                (current_avg * current_qty + price * quantity) / (current_qty + quantity)
-                            )
-                        else:
-                            user_data["portfolio"][symbol] = {"quantity": quantity, "avg_price": price}
-                        user_data["transactions"].append({
-                            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "symbol": symbol, "action": "Buy", "quantity": quantity, "price": price, "total": total_cost
-                        })
+                    transaction = {
+                        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "symbol": symbol, "action": "Buy", "quantity": quantity, "price": price, "total": total_cost
+                    }
+                    if total_cost <= user_data["balance"] and get_user_store().record_trade(st.session_state.username, transaction):
+                        apply_trade(user_data, transaction)
                         st.session_state.bought_price[symbol] = price
                         st.session_state.current_price = price
                         st.session_state.buy_message = f"Bought {quantity} shares at ${price:.2f}"
-                        save_users(users)
                     else:
                         st.error("Insufficient funds! 🚫")
         with col2:
@@ -1521,22 +1522,26 @@ def main_app():
                 if price <= 0:
                     st.error("Cannot sell: Current price is zero! 🚫")
                 else:
-                    if symbol in user_data["portfolio"] and user_data["portfolio"][symbol]["quantity"] >= quantity:
-                        total_cost = price * quantity
-                        user_data["portfolio"][symbol]["quantity"] -= quantity
-                        user_data["balance"] += total_cost
-                        if user_data["portfolio"][symbol]["quantity"] == 0:
-                            del user_data["portfolio"][symbol]
-                        user_data["transactions"].append({
-                            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "symbol": symbol, "action": "Sell", "quantity": quantity, "price": price, "total": total_cost
-                        })
-                        st.session_state.sold_price[symbol] = price
-                        st.session_state.current_price = price
-                        st.session_state.sell_message = f"Sold {quantity} shares at ${price:.2f}"
-                        save_users(users)
+                    total_cost = price * quantity
+                    transaction = {
+                        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "symbol": symbol, "action": "Sell", "quantity": quantity, "price": price, "total": total_cost
+                    }
+                    held = symbol in user_data["portfolio"] and user_data["portfolio"][symbol]["quantity"] >= quantity
+                    try:
+                        transaction["lots"] = lot_book.allocate(symbol, quantity, lot_method, chosen_lots, partial=lot_method != "Specific lots")
+                    except ValueError as e:
+                        st.error(f"{e} 🚫")
                     else:
-                        st.error("Not enough shares! 🚫")
+                        if held and get_user_store().record_trade(st.session_state.username, transaction):
+                            realized_before = lot_book.realized.get(symbol, 0.0)
+                            apply_trade(user_data, transaction)
+                            realized = lot_book.realized.get(symbol, 0.0) - realized_before
+                            st.session_state.sold_price[symbol] = price
+                            st.session_state.current_price = price
+                            st.session_state.sell_message = f"Sold {quantity} shares at ${price:.2f} (realized p/l ${realized:.2f})"
+                        else:
+                            st.error("Not enough shares! 🚫")
 
         # Display Buy/Sell Messages
         if st.session_state.buy_message:
@@ -1551,11 +1556,11 @@ def main_app():
             
             # Initial chart rendering
             fig = go.Figure(data=[go.Candlestick(
-                x=st.session_state.candle_data["time"],
-                open=st.session_state.candle_data["open"],
-                high=st.session_state.candle_data["high"],
-                low=st.session_state.candle_data["low"],
-                close=st.session_state.candle_data["close"],
+                x=st.session_state.candle_data.times(),
+                open=st.session_state.candle_data.column("open"),
+                high=st.session_state.candle_data.column("high"),
+                low=st.session_state.candle_data.column("low"),
+                close=st.session_state.candle_data.column("close"),
                 increasing_line_color='green',
                 decreasing_line_color='red'
             )])
@@ -1566,22 +1571,22 @@ def main_app():
                 xaxis_rangeslider_visible=True,
                 height=500,
                 template="plotly_dark",
-                xaxis=dict(tickformat="%H:%M:%S", tickangle=45, nticks=8),
+                xaxis=dict(tickformat="%Y-%m-%d" if chart_interval == "1d" else "%H:%M:%S", tickangle=45, nticks=8),
             )
             chart_placeholder.plotly_chart(fig, use_container_width=True)
 
             # Smooth update loop every second when trading is active
             if st.session_state.trading_active:
                 while st.session_state.trading_active:
-                    # Update candle data every second
-                    update_candle_data(symbol)
+                    # Block until the shared price bus publishes the next tick
+                    update_candle_data(symbol, chart_interval)
                     # Update the chart with new data
                     fig = go.Figure(data=[go.Candlestick(
-                        x=st.session_state.candle_data["time"],
-                        open=st.session_state.candle_data["open"],
-                        high=st.session_state.candle_data["high"],
-                        low=st.session_state.candle_data["low"],
-                        close=st.session_state.candle_data["close"],
+                        x=st.session_state.candle_data.times(),
+                        open=st.session_state.candle_data.column("open"),
+                        high=st.session_state.candle_data.column("high"),
+                        low=st.session_state.candle_data.column("low"),
+                        close=st.session_state.candle_data.column("close"),
                         increasing_line_color='green',
                         decreasing_line_color='red'
                     )])
@@ -1592,16 +1597,14 @@ def main_app():
                         xaxis_rangeslider_visible=True,
                         height=500,
                         template="plotly_dark",
-                        xaxis=dict(tickformat="%H:%M:%S", tickangle=45, nticks=8),
+                        xaxis=dict(tickformat="%Y-%m-%d" if chart_interval == "1d" else "%H:%M:%S", tickangle=45, nticks=8),
                     )
                     chart_placeholder.plotly_chart(fig, use_container_width=True)
-                    # Wait for 1 second before the next update
-                    time.sleep(1)
 
     # Portfolio
     elif choice == "Portfolio 💼":
         st.title("Portfolio 💼")
-        stats = calculate_portfolio_stats(user_data)
+        stats = portfolio_stats  # valued once per rerun, in the sidebar
         st.markdown(f"""
             <div class="glass">
                 <h3>Account summary</h3>
@@ -1609,6 +1612,8 @@ def main_app():
                 <p>Portfolio value: ${stats['portfolio_value']:.2f}</p>
                 <p>Total assets: {stats['total_assets']}</p>
                 <p>Total shares: {stats['total_shares']}</p>
+                <p>Gross exposure: {stats['gross_exposure']:.1%} of equity</p>
+                <p>Realized p/l: ${get_lot_book().realized_total():.2f}</p>
                 <p>Net p/l: <span style="color: {'#00ff00' if stats['net_profit_loss'] >= 0 else '#ff0000'}">${stats['net_profit_loss']:.2f}</span></p>
             </div>
         """, unsafe_allow_html=True)
@@ -1620,11 +1625,15 @@ def main_app():
             st.table(breakdown_df)
             st.markdown('</div>', unsafe_allow_html=True)
 
-            if st.session_state.portfolio_history:
-                df = pd.DataFrame(st.session_state.portfolio_history)
-                fig = px.line(df, x="time", y="value", title="Portfolio Performance Over Time", template="plotly_dark")
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
+        # Persisted equity curve; longer ranges come from the hourly and daily tiers
+        history_ranges = {"1 day": 86400, "1 week": 7 * 86400, "1 month": 30 * 86400, "1 year": 365 * 86400, "All": None}
+        history_range = st.radio("Range 🕒", list(history_ranges), index=1, horizontal=True, key="equity_range")
+        seconds = history_ranges[history_range]
+        df = equity_history(st.session_state.username, start=None if seconds is None else time.time() - seconds)
+        if not df.empty:
+            fig = px.line(df, x="time", y="value", title="Portfolio Performance Over Time", template="plotly_dark")
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
 
     # Watchlist
     elif choice == "Watchlist 👀":
@@ -1633,7 +1642,7 @@ def main_app():
         if st.button("Add ➕"):
             if new_symbol and new_symbol not in user_data["watchlist"]:
                 user_data["watchlist"].append(new_symbol)
-                save_users(users)
+                get_user_store().add_to_watchlist(st.session_state.username, new_symbol)
                 st.success(f"{new_symbol} added to watchlist! ✅")
 
         if user_data["watchlist"]:
@@ -1645,13 +1654,48 @@ def main_app():
     # Transactions
     elif choice == "Transactions 📜":
         st.title("Transactions 📜")
-        if user_data["transactions"]:
+        store = get_user_store()
+        traded_symbols = store.transaction_symbols(st.session_state.username)
+        if traded_symbols:
             st.markdown('<div class="glass"><h3>Your transactions</h3>', unsafe_allow_html=True)
-            transactions_df = pd.DataFrame(user_data["transactions"])
-            transactions_df.index = range(1, len(transactions_df) + 1)
-            # Convert column names to sentence case
-            transactions_df.columns = [col.capitalize() if col.lower() == col else ' '.join(word.capitalize() if i == 0 else word.lower() for i, word in enumerate(col.split())) for col in transactions_df.columns]
-            st.table(transactions_df)
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                symbol_filter = st.selectbox("Symbol 🎫", ["All"] + traded_symbols, key="txn_symbol")
+            with col2:
+                action_filter = st.selectbox("Action 🔁", ["All", "Buy", "Sell"], key="txn_action")
+            with col3:
+                date_range = st.date_input("Date range 📅", value=[], key="txn_dates")
+            with col4:
+                page_size = st.selectbox("Rows per page", [25, 50, 100], key="txn_page_size")
+                newest_first = st.checkbox("Newest first", value=True, key="txn_newest")
+            start = f"{date_range[0]} 00:00:00" if len(date_range) >= 1 else None
+            end = f"{date_range[-1]} 23:59:59" if len(date_range) >= 1 else None
+            page = st.number_input("Page 📄", min_value=1, value=1, step=1, key="txn_page")
+            # Only the visible page is fetched; the total comes back with it
+            query = dict(
+                symbol=None if symbol_filter == "All" else symbol_filter,
+                action=None if action_filter == "All" else action_filter,
+                start=start, end=end, descending=newest_first, limit=page_size
+            )
+            rows, total = store.query_transactions(st.session_state.username, offset=(page - 1) * page_size, **query)
+            pages = max(1, -(-total // page_size))
+            if page > pages:
+                page = pages
+                rows, total = store.query_transactions(st.session_state.username, offset=(page - 1) * page_size, **query)
+            if rows:
+                offset = (page - 1) * page_size
+                transactions_df = pd.DataFrame(rows)
+                transactions_df.index = range(offset + 1, offset + len(transactions_df) + 1)
+                if "lots" in transactions_df.columns:
+                    transactions_df["lots"] = transactions_df["lots"].apply(
+                        lambda lots: ", ".join(f"#{lot_id}×{qty}" for lot_id, qty in lots) if isinstance(lots, list) else ""
+                    )
+                # Convert column names to sentence case
+                transactions_df.columns = [col.capitalize() if col.lower() == col else ' '.join(word.capitalize() if i == 0 else word.lower() for i, word in enumerate(col.split())) for col in transactions_df.columns]
+                st.caption(f"Showing {offset + 1}-{offset + len(rows)} of {total} transactions (page {page} of {pages})")
+                st.table(transactions_df)
+            else:
+                st.info("No transactions match these filters.")
             st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.markdown('<div class="glass"><h3>No transactions yet</h3><p>Start trading to see your transactions here! 🚀</p></div>', unsafe_allow_html=True)
@@ -1672,7 +1716,7 @@ def main_app():
                     st.session_state.email = new_email
                 if new_password:
                     user_data["password"] = new_password
-                save_users(users)
+                get_user_store().update_profile(st.session_state.username, email=new_email, password=new_password)
                 st.success("Profile updated successfully! ✅")
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -1815,6 +1859,47 @@ The TradeRiser Team 🌟
 
         st.markdown('</div>', unsafe_allow_html=True)
 
+        # Mean-variance optimizer over holdings and watchlist
+        st.markdown('<div class="glass"><h3>Portfolio optimization</h3>', unsafe_allow_html=True)
+        opt_symbols = list(dict.fromkeys(list(user_data["portfolio"]) + user_data["watchlist"]))
+        if len(opt_symbols) >= 2:
+            risk_free = st.number_input("Risk-free rate (%) 🏦", min_value=0.0, max_value=20.0, value=4.0, step=0.25, key="opt_risk_free") / 100
+            opt = optimize_portfolio(opt_symbols, risk_free)
+            if len(opt["symbols"]) >= 2:
+                frontier = pd.DataFrame(opt["frontier"], columns=["Return", "Volatility", "Sharpe"])
+                fig = go.Figure()
+                fig.add_trace(go.Scatter(x=frontier["Volatility"], y=frontier["Return"], mode="lines", name="Efficient frontier"))
+                fig.add_trace(go.Scatter(
+                    x=[vol for _, vol in opt["assets"]], y=[ret for ret, _ in opt["assets"]],
+                    mode="markers+text", text=opt["symbols"], textposition="top center", name="Assets"
+                ))
+                for label, key in (("Min variance", "min_variance"), ("Max Sharpe", "max_sharpe")):
+                    ret, vol, _ = opt[key]["performance"]
+                    fig.add_trace(go.Scatter(x=[vol], y=[ret], mode="markers", marker=dict(size=14, symbol="star"), name=label))
+                fig.update_layout(
+                    title="Efficient Frontier", xaxis_title="Annual volatility", yaxis_title="Annual return",
+                    xaxis_tickformat=".0%", yaxis_tickformat=".0%", template="plotly_dark", height=450
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                col1, col2 = st.columns(2)
+                for col, label, key in ((col1, "Min variance", "min_variance"), (col2, "Max Sharpe", "max_sharpe")):
+                    ret, vol, sharpe = opt[key]["performance"]
+                    weights_df = pd.DataFrame({"Symbol": opt["symbols"], "Weight": opt[key]["weights"]})
+                    weights_df = weights_df[weights_df["Weight"] >= 0.0005].sort_values("Weight", ascending=False)
+                    weights_df["Weight"] = weights_df["Weight"].apply(lambda w: f"{w:.2%}")
+                    weights_df.index = range(1, len(weights_df) + 1)
+                    with col:
+                        st.markdown(f'<h4>{label}</h4>', unsafe_allow_html=True)
+                        st.markdown(f'<p>Return {ret:.2%} · Volatility {vol:.2%} · Sharpe {sharpe:.2f}</p>', unsafe_allow_html=True)
+                        st.table(weights_df)
+            else:
+                st.warning("Not enough price history to optimize these symbols. 📉")
+            if opt["missing"]:
+                st.caption(f"No history for {', '.join(opt['missing'])}")
+        else:
+            st.markdown('<p>Hold or watch at least two symbols to optimize a portfolio.</p>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
     # Risk Calculator
     elif choice == "Risk Calculator ⚖️":
         st.title("Risk Calculator ⚖️")
@@ -1834,6 +1919,38 @@ The TradeRiser Team 🌟
             """, unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
+        # Value at risk of the current holdings, from cached daily returns
+        st.markdown('<div class="glass"><h3>Portfolio value at risk</h3>', unsafe_allow_html=True)
+        if user_data["portfolio"]:
+            col1, col2 = st.columns(2)
+            with col1:
+                method = st.radio("Method 🧮", ["Historical simulation", "Parametric"], horizontal=True, key="var_method")
+            with col2:
+                confidence = st.select_slider("Confidence 🎯", options=[0.90, 0.95, 0.975, 0.99], value=0.95, format_func=lambda c: f"{c:.1%}", key="var_confidence")
+            symbols = list(user_data["portfolio"])
+            prices = dict(zip(symbols, price_vector(symbols, get_quotes(symbols), st.session_state.last_price).tolist()))
+            risk = portfolio_risk(user_data["portfolio"], prices, confidence, "historical" if method == "Historical simulation" else "parametric")
+            var_df = pd.DataFrame([
+                {
+                    "Horizon": f"{horizon} day" + ("s" if horizon > 1 else ""),
+                    "VaR": f"${risk['horizons'][horizon]['var']:,.2f}",
+                    "VaR (% of holdings)": f"{risk['horizons'][horizon]['var_pct']:.2%}",
+                    "CVaR": f"${risk['horizons'][horizon]['cvar']:,.2f}",
+                    "CVaR (% of holdings)": f"{risk['horizons'][horizon]['cvar_pct']:.2%}"
+                }
+                for horizon in HORIZONS
+            ])
+            var_df.index = range(1, len(var_df) + 1)
+            st.table(var_df)
+            st.caption(
+                f"Holdings value ${risk['value']:,.2f}; {risk['observations']} daily observations"
+                + (f" since {risk['start']}" if risk['start'] else "")
+                + (f"; no history for {', '.join(risk['missing'])}" if risk['missing'] else "")
+            )
+        else:
+            st.markdown('<p>Buy some shares to see the value at risk of your portfolio.</p>', unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
     # Recent Data
     elif choice == "Recent Data 📈":
         st.title("Recent Data 📈")
@@ -1853,13 +1970,15 @@ The TradeRiser Team 🌟
         if st.button("Set Alert 🔔"):
             st.session_state.price_alerts.append({"symbol": alert_symbol, "target_price": target_price})
             user_data["price_alerts"] = st.session_state.price_alerts
-            save_users(users)
+            get_user_store().set_price_alerts(st.session_state.username, st.session_state.price_alerts)
             st.success(f"Alert set for {alert_symbol} at ${target_price:.2f}! 🔔")
 
         if st.session_state.price_alerts:
             st.markdown('<h4>Your alerts</h4>', unsafe_allow_html=True)
             alerts_df = pd.DataFrame(st.session_state.price_alerts)
-            alerts_df["Current price"] = alerts_df["symbol"].apply(lambda x: st.session_state.last_price.get(x, get_current_price(x)))
+            quotes = get_quotes(alerts_df["symbol"].tolist())
+            alerts_df["Current price"] = alerts_df["symbol"].apply(lambda x: st.session_state.last_price.get(x, quotes.get(x, 0.0)))
+            alerts_df["Quote age (s)"] = alerts_df["symbol"].apply(lambda x: round(quote_age(x) or 0.0, 1))
             alerts_df.index = range(1, len(alerts_df) + 1)
             # Convert column names to sentence case
             alerts_df.columns = [col.capitalize() if col.lower() == col else ' '.join(word.capitalize() if i == 0 else word.lower() for i, word in enumerate(col.split())) for col in alerts_df.columns]
@@ -1869,6 +1988,7 @@ The TradeRiser Team 🌟
 # Main execution
 if __name__ == "__main__":
     st.set_page_config(page_title="TradeRiser", page_icon="📈", layout="wide")
+    start_prefetcher(lambda: get_user_store().load_holdings(), MOVERS_SYMBOLS + RECENT_DATA_SYMBOLS)
     initialize_session_state()
 
     if not st.session_state.logged_in:
@@ -0,0 +1,164 @@
+import os
+import random
+import threading
+import time
+
+# Raised instead of calling out while a host's circuit breaker is open
+class CircuitOpenError(Exception):
+    pass
+
+# Raised when no request token could be had within the wait budget
+class RateLimitedError(Exception):
+    pass
+
+# Token bucket: `rate` requests per second on average, bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+# Opens after `failure_threshold` consecutive failures, then lets a single
+# probe through once `reset_timeout` seconds have passed (half-open).
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+# Default per-host budgets as (requests per second, burst). Override with e.g.
+# TRADESENSE_RATE_YFINANCE="2,10".
+DEFAULT_BUDGETS = {
+    "yfinance": (2.0, 10),
+    "yahoo-web": (0.5, 2),
+}
+RETRIES = 2
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+TOKEN_WAIT = 10.0
+
+def _budget_from_env(host, default):
+    value = os.environ.get(f"TRADESENSE_RATE_{host.upper().replace('-', '_')}")
+    if not value:
+        return default
+    rate, burst = value.split(",")
+    return float(rate), int(burst)
+
+# Every outbound market-data call goes through here: per-host token bucket,
+# jittered exponential backoff between retries and a per-host circuit breaker.
+class FetchGateway:
+    def __init__(self, budgets=None):
+        self._hosts = {}
+        self._lock = threading.Lock()
+        for host, budget in (budgets or DEFAULT_BUDGETS).items():
+            self.configure_host(host, *_budget_from_env(host, budget))
+
+    def configure_host(self, host, rate, burst, failure_threshold=5, reset_timeout=30):
+        with self._lock:
+            self._hosts[host] = {
+                "bucket": TokenBucket(rate, burst),
+                "breaker": CircuitBreaker(failure_threshold, reset_timeout),
+                "calls": 0,
+                "retries": 0,
+                "failures": 0,
+                "rejected": 0,
+            }
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self.configure_host(host, *DEFAULT_BUDGETS["yfinance"])
+        return self._hosts[host]
+
+    def call(self, host, fn, *args, retries=RETRIES, **kwargs):
+        entry = self._host(host)
+        breaker = entry["breaker"]
+        for attempt in range(retries + 1):
+            if breaker.state == "open":
+                entry["rejected"] += 1
+                raise CircuitOpenError(f"{host} circuit is open")
+            if not entry["bucket"].acquire(timeout=TOKEN_WAIT):
+                entry["rejected"] += 1
+                raise RateLimitedError(f"{host} request budget exhausted")
+            if not breaker.allow():
+                entry["rejected"] += 1
+                raise CircuitOpenError(f"{host} circuit is open")
+            entry["calls"] += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                entry["failures"] += 1
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+                entry["retries"] += 1
+                delay = min(MAX_DELAY, BASE_DELAY * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+            else:
+                breaker.record_success()
+                return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {
+                    "state": entry["breaker"].state,
+                    "calls": entry["calls"],
+                    "retries": entry["retries"],
+                    "failures": entry["failures"],
+                    "rejected": entry["rejected"],
+                }
+                for host, entry in self._hosts.items()
+            }
+
+gateway = FetchGateway()
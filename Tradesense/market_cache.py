@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from gateway import gateway
+
+# How long cached bars stay fresh, keyed by yfinance bar interval (seconds)
+INTERVAL_TTL = {
+    "1m": 30,
+    "2m": 60,
+    "5m": 120,
+    "15m": 300,
+    "30m": 600,
+    "60m": 900,
+    "90m": 900,
+    "1h": 900,
+    "1d": 6 * 3600,
+    "5d": 12 * 3600,
+    "1wk": 12 * 3600,
+    "1mo": 24 * 3600,
+    "3mo": 24 * 3600,
+}
+DEFAULT_TTL = 300
+
+def ttl_for_interval(interval):
+    return INTERVAL_TTL.get(interval, DEFAULT_TTL)
+
+# Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+# Lives at module level so every Streamlit session in the process shares it.
+class TTLCache:
+    def __init__(self, max_entries=256, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Last stored value even if expired, for serving stale data when a refresh fails.
+    # Expired entries are only dropped by LRU eviction, so this is the last good value.
+    def get_stale(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry[1]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_hits": self.stale_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+# Shared price-history cache keyed by (symbol, period, interval)
+history_cache = TTLCache(max_entries=512)
+
+def get_cached_history(symbol, period, interval):
+    return history_cache.get((symbol, period, interval))
+
+def get_stale_history(symbol, period, interval):
+    return history_cache.get_stale((symbol, period, interval))
+
+def set_cached_history(symbol, period, interval, df):
+    history_cache.set((symbol, period, interval), df, ttl=ttl_for_interval(interval))
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Single-flight request coalescing: concurrent callers asking for the same key
+# wait on the one in-flight fetch and share its result (or its exception).
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+# Shared by every data function so their metrics land in one place
+flight = SingleFlight()
+
+def fetch_metrics():
+    return {"history_cache": history_cache.stats(), "single_flight": flight.stats(), "gateway": gateway.stats()}
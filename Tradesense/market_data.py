@@ -0,0 +1,232 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from market_cache import TTLCache, flight, get_cached_history, get_stale_history, set_cached_history
+from providers import get_provider, slice_period
+
+# 1-minute history is only served for recent periods
+INTRADAY_PERIODS = ("1d", "5d", "7d")
+
+# Fetch raw history for one symbol through the shared cache.
+# If the refresh fails, the last good (expired) frame is served instead. yfinance
+# reports throttling and network errors as an empty frame, so an empty result
+# counts as a failure and is never cached over a good frame.
+def fetch_history(symbol, period="1d", interval="1m"):
+    cached = get_cached_history(symbol, period, interval)
+    if cached is not None:
+        return cached
+
+    def fetch():
+        try:
+            if interval == "1m" and period in INTRADAY_PERIODS:
+                df = intraday_series.refresh(symbol, period)
+            else:
+                df = get_provider().history(symbol, period=period, interval=interval)
+        except Exception:
+            stale = get_stale_history(symbol, period, interval)
+            if stale is not None:
+                return stale
+            raise
+        if df.empty:
+            stale = get_stale_history(symbol, period, interval)
+            return df if stale is None else stale
+        set_cached_history(symbol, period, interval, df)
+        return df
+    return flight.do(("history", symbol, period, interval), fetch)
+
+# Split one symbol's OHLCV columns out of a batched download
+def _split_download(raw, symbol, single):
+    if raw is None or raw.empty:
+        return pd.DataFrame()
+    if not isinstance(raw.columns, pd.MultiIndex):
+        return raw.dropna(how="all") if single else pd.DataFrame()
+    if symbol not in raw.columns.get_level_values(0):
+        return pd.DataFrame()
+    return raw[symbol].dropna(how="all")
+
+# One batched download call for all symbols, split into a {symbol: frame} dict.
+# Symbols the download failed for map to empty frames. With `start`, only bars
+# from that timestamp on are requested instead of the whole period.
+def download_frames(symbols, period="1d", interval="1m", start=None):
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+
+    def fetch():
+        try:
+            raw = get_provider().download(symbols, period=period, interval=interval, start=start)
+        except Exception:
+            raw = None
+        return {symbol: _split_download(raw, symbol, single=len(symbols) == 1) for symbol in symbols}
+    return flight.do(("download", tuple(sorted(symbols)), period, interval, start), fetch)
+
+# Intraday 1m series per (symbol, period) that refresh by delta: known symbols
+# only request bars from their last stored minute on (that minute may have been
+# partial), and the new bars replace the tail of the stored series.
+class IntradaySeries:
+    def __init__(self, max_symbols=1024):
+        self._series = TTLCache(max_entries=max_symbols, default_ttl=24 * 3600)
+        self.full_fetches = 0
+        self.delta_fetches = 0
+        self.bars_received = 0
+
+    def last_timestamp(self, symbol, period="1d"):
+        df = self._series.get((symbol, period))
+        return None if df is None or df.empty else df.index[-1]
+
+    def _merge(self, symbol, period, delta):
+        current = self._series.get((symbol, period))
+        if current is None or current.empty:
+            merged = delta
+        elif delta.empty:
+            merged = current
+        else:
+            merged = pd.concat([current[current.index < delta.index[0]], delta])
+        merged = slice_period(merged, period)
+        if not merged.empty:
+            self._series.set((symbol, period), merged)
+        return merged
+
+    def refresh_many(self, symbols, period="1d"):
+        symbols = list(dict.fromkeys(symbols))
+        last = {symbol: self.last_timestamp(symbol, period) for symbol in symbols}
+        fresh = [symbol for symbol in symbols if last[symbol] is None]
+        known = [symbol for symbol in symbols if last[symbol] is not None]
+        frames = {}
+        if fresh:
+            self.full_fetches += 1
+            frames.update(download_frames(fresh, period=period, interval="1m"))
+        if known:
+            self.delta_fetches += 1
+            start = min(last[symbol] for symbol in known)
+            frames.update(download_frames(known, period=period, interval="1m", start=start))
+        result = {}
+        for symbol in symbols:
+            delta = frames.get(symbol, pd.DataFrame())
+            self.bars_received += len(delta)
+            result[symbol] = self._merge(symbol, period, delta)
+        return result
+
+    def refresh(self, symbol, period="1d"):
+        return self.refresh_many([symbol], period)[symbol]
+
+    def stats(self):
+        return {
+            "full_fetches": self.full_fetches,
+            "delta_fetches": self.delta_fetches,
+            "bars_received": self.bars_received,
+            "symbols": self._series.stats()["size"]
+        }
+
+intraday_series = IntradaySeries()
+
+# Bulk bar download: one batched call covers every symbol missing from the cache.
+# Symbols the download fails for fall back to their last good cached bars.
+# Returns a single frame on a shared time index with (symbol, field) columns.
+def download_bars(symbols, period="1d", interval="1m"):
+    symbols = list(dict.fromkeys(symbols))
+    frames = {}
+    missing = []
+    for symbol in symbols:
+        cached = get_cached_history(symbol, period, interval)
+        if cached is None:
+            missing.append(symbol)
+        else:
+            frames[symbol] = cached
+
+    if interval == "1m" and period in INTRADAY_PERIODS:
+        downloaded = intraday_series.refresh_many(missing, period)
+    else:
+        downloaded = download_frames(missing, period=period, interval=interval)
+    for symbol, df in downloaded.items():
+        if not df.empty:
+            set_cached_history(symbol, period, interval, df)
+        else:
+            stale = get_stale_history(symbol, period, interval)
+            if stale is not None:
+                df = stale
+        frames[symbol] = df
+
+    present = {symbol: frames[symbol] for symbol in symbols if not frames[symbol].empty}
+    if not present:
+        return pd.DataFrame()
+    return pd.concat(present, axis=1).sort_index()
+
+# One symbol's bars from a download_bars frame, or an empty frame if it has none
+def symbol_bars(bars, symbol):
+    if bars.empty or symbol not in bars.columns.get_level_values(0):
+        return pd.DataFrame()
+    return bars[symbol].dropna(how="all")
+
+# Per-symbol field matrix (time x symbol), e.g. every Close in one frame
+def field_matrix(bars, field):
+    if bars.empty:
+        return pd.DataFrame()
+    return bars.xs(field, axis=1, level=1)
+
+# Sector ETFs shown in the Sector-Wise Performance table
+SECTOR_ETFS = {
+    "Technology": "XLK",
+    "Healthcare": "XLV",
+    "Financials": "XLF",
+    "Consumer Discretionary": "XLY",
+    "Energy": "XLE",
+    "Utilities": "XLU",
+    "Real Estate": "XLRE",
+    "Materials": "XLB",
+    "Industrials": "XLI",
+    "Communication Services": "XLC",
+    "Consumer Staples": "XLP"
+}
+SECTOR_TTL = 900
+
+sector_cache = TTLCache(max_entries=8, default_ttl=SECTOR_TTL)
+_sector_lock = threading.Lock()
+
+def _timed_sector_change(ticker, period):
+    start = time.perf_counter()
+    change = None
+    try:
+        data = get_provider().history(ticker, period=period)
+        if not data.empty:
+            closes = data["Close"]
+            change = round(float((closes.iloc[-1] - closes.iloc[0]) / closes.iloc[0] * 100), 2)
+    except Exception:
+        pass
+    return change, round(time.perf_counter() - start, 3)
+
+# Sector performance over `period`, fetched concurrently and computed at most once
+# per SECTOR_TTL for the whole process. Returns performance plus per-sector timings.
+def fetch_sector_performance(period="1mo"):
+    key = ("sectors", period)
+    result = sector_cache.get(key)
+    if result is not None:
+        return result
+    with _sector_lock:
+        result = sector_cache.get(key)
+        if result is not None:
+            return result
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(SECTOR_ETFS)) as pool:
+            futures = {
+                sector: pool.submit(_timed_sector_change, ticker, period)
+                for sector, ticker in SECTOR_ETFS.items()
+            }
+        performance = {}
+        timings = {}
+        for sector, future in futures.items():
+            change, elapsed = future.result()
+            timings[sector] = elapsed
+            if change is not None:
+                performance[sector] = change
+        result = {
+            "performance": performance,
+            "timings": timings,
+            "total_seconds": round(time.perf_counter() - start, 3),
+            "computed_at": time.time()
+        }
+        if performance:
+            sector_cache.set(key, result)
+            return result
+        return sector_cache.get_stale(key) or result
@@ -0,0 +1,134 @@
+import argparse
+import os
+import time
+import pandas as pd
+from fileutil import atomic_write
+from market_cache import flight, ttl_for_interval
+from providers import get_provider
+
+# One Parquet file of daily bars per ticker
+STORE_DIR = os.environ.get("TRADESENSE_OHLCV_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ohlcv"))
+HISTORY_YEARS = 3
+
+def _path(symbol):
+    return os.path.join(STORE_DIR, f"{symbol.upper()}.parquet")
+
+# Read stored daily bars for a ticker, or an empty frame if none exist
+def load_daily_bars(symbol):
+    path = _path(symbol)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return pd.DataFrame()
+
+# Write atomically so a concurrent reader never sees a half-written file
+def _save(symbol, df):
+    atomic_write(_path(symbol), df.to_parquet())
+
+def _is_fresh(symbol):
+    path = _path(symbol)
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < ttl_for_interval("1d")
+
+# A dividend or split in the delta rewrites yfinance's back-adjusted prices,
+# so the stored history can no longer be extended and must be refetched.
+def _has_corporate_action(df):
+    for column in ("Dividends", "Stock Splits"):
+        if column in df.columns and (df[column].fillna(0) != 0).any():
+            return True
+    return False
+
+# Bring the stored history up to date, fetching only bars after the last stored day.
+# The last stored day is refetched as well because it may have been a partial session.
+# A stale store fetched for a shorter window than `years` is refetched in full.
+# The window is recorded in the file, so a ticker with less history than the
+# window (a recent IPO) is not refetched just because its bars start later.
+# Concurrent callers for the same ticker share one update.
+# If the provider fails, whatever is already stored is served as-is.
+def update_daily_bars(symbol, years=HISTORY_YEARS):
+    return flight.do(("daily", symbol.upper(), years), lambda: _update_daily_bars(symbol, years))
+
+# Years of history the stored file was fetched for. Files written before the
+# window was recorded count as covering it if their bars reach back far enough
+# (with a week of slack for weekends and holidays at the cutoff).
+def _fetched_years(df, years):
+    fetched = df.attrs.get("history_years")
+    if fetched is not None:
+        return fetched
+    return years if df.index[0] <= df.index[-1] - pd.DateOffset(years=years) + pd.Timedelta(days=7) else 0
+
+def _update_daily_bars(symbol, years):
+    stored = load_daily_bars(symbol)
+    if not stored.empty and _is_fresh(symbol):
+        return stored
+
+    provider = get_provider()
+    window = years
+    if stored.empty:
+        merged = provider.history(symbol, period=f"{years}y", interval="1d")
+    elif _fetched_years(stored, years) < years:
+        try:
+            merged = provider.history(symbol, period=f"{years}y", interval="1d")
+        except Exception:
+            return stored
+        if merged.empty:
+            return stored
+    else:
+        window = _fetched_years(stored, years)
+        last_day = stored.index[-1]
+        try:
+            delta = provider.history(symbol, start=last_day.strftime("%Y-%m-%d"), interval="1d")
+            if delta.empty:
+                merged = stored
+            elif _has_corporate_action(delta):
+                merged = provider.history(symbol, period=f"{window}y", interval="1d")
+            else:
+                merged = pd.concat([stored[stored.index < delta.index[0]], delta])
+                merged = merged[~merged.index.duplicated(keep="last")]
+        except Exception:
+            return stored
+
+    if merged is stored:
+        os.utime(_path(symbol))
+    elif not merged.empty:
+        merged.attrs["history_years"] = window
+        _save(symbol, merged)
+    return merged
+
+# Daily bars for the last `years` years, served from the local store. The store
+# always holds at least HISTORY_YEARS, so a short window never truncates it for
+# callers that want more.
+def get_daily_history(symbol, years=HISTORY_YEARS):
+    df = update_daily_bars(symbol, years=max(years, HISTORY_YEARS))
+    if df.empty:
+        return df
+    cutoff = df.index[-1] - pd.DateOffset(years=years)
+    return df[df.index > cutoff]
+
+# CLI: python ohlcv_store.py AAPL MSFT ... [--file tickers.txt]
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the local daily OHLCV store.")
+    parser.add_argument("tickers", nargs="*", help="Ticker symbols to backfill")
+    parser.add_argument("--file", help="Text file with one ticker per line")
+    parser.add_argument("--years", type=int, default=HISTORY_YEARS, help="Years of history to keep on first fetch")
+    args = parser.parse_args()
+
+    tickers = [ticker.upper() for ticker in args.tickers]
+    if args.file:
+        with open(args.file) as f:
+            tickers += [line.strip().upper() for line in f if line.strip() and not line.startswith("#")]
+    if not tickers:
+        parser.error("no tickers given")
+
+    for ticker in dict.fromkeys(tickers):
+        start = time.time()
+        try:
+            df = update_daily_bars(ticker, years=args.years)
+            last = df.index[-1].date() if not df.empty else "n/a"
+            print(f"{ticker}: {len(df)} bars, last {last} ({time.time() - start:.2f}s)")
+        except Exception as e:
+            print(f"{ticker}: failed ({e})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+from datetime import date
+import numpy as np
+from scipy.optimize import minimize
+from market_cache import TTLCache
+from returns import returns_matrix
+
+TRADING_DAYS = 252
+LOOKBACK_YEARS = 2
+FRONTIER_POINTS = 20
+
+# Annualized expected returns and covariance, reused for the rest of the day
+moments_cache = TTLCache(max_entries=256, default_ttl=6 * 3600)
+
+# Annualized mean returns and covariance matrix for the symbols that have
+# enough daily history. Returns (symbols, mu, cov).
+# Cached per symbol set and calendar day.
+def return_moments(symbols, years=LOOKBACK_YEARS):
+    key = (tuple(sorted(set(symbols))), years, date.today().isoformat())
+    cached = moments_cache.get(key)
+    if cached is not None:
+        return cached
+    returns = returns_matrix(symbols, years)
+    kept = list(returns.columns)
+    daily = returns.to_numpy()
+    if len(daily) < 2:
+        moments = ([], np.empty(0), np.empty((0, 0)))
+    else:
+        mu = daily.mean(axis=0) * TRADING_DAYS
+        cov = np.cov(daily, rowvar=False).reshape(len(kept), len(kept)) * TRADING_DAYS
+        moments = (kept, mu, cov)
+    moments_cache.set(key, moments)
+    return moments
+
+def portfolio_performance(weights, mu, cov, risk_free=0.0):
+    ret = float(weights @ mu)
+    vol = float(np.sqrt(max(weights @ cov @ weights, 0.0)))
+    return ret, vol, (ret - risk_free) / vol if vol else 0.0
+
+# Long-only, fully invested SLSQP solve with an analytic gradient.
+# `equalities` are extra (a, b) constraints a.w = b. SLSQP's cost grows with
+# the cube of the asset count while optimal portfolios hold few assets, so it
+# solves over a working set (`active`, default all) and then checks the full
+# problem's optimality conditions: an excluded asset whose reduced cost is
+# negative would lower the objective, so it joins the set and the solve repeats.
+def _solve(objective, n, start=None, equalities=(), active=None):
+    start = np.full(n, 1.0 / n) if start is None else start
+    rows = np.vstack([np.ones(n), *[a for a, _ in equalities]])
+    targets = np.array([1.0, *[b for _, b in equalities]])
+    active = np.arange(n) if active is None else np.unique(active)
+    while True:
+        def sub_objective(x):
+            w = np.zeros(n)
+            w[active] = x
+            value, grad = objective(w)
+            return value, grad[active]
+        sub_rows = rows[:, active]
+        x0 = start[active]
+        x0 = x0 / x0.sum() if x0.sum() > 0 else np.full(len(active), 1.0 / len(active))
+        result = minimize(
+            sub_objective, x0, jac=True, method="SLSQP", bounds=[(0.0, 1.0)] * len(active),
+            constraints=[{"type": "eq", "fun": lambda x: sub_rows @ x - targets, "jac": lambda x: sub_rows}],
+            options={"maxiter": 200, "ftol": 1e-9}
+        )
+        weights = np.zeros(n)
+        weights[active] = np.clip(result.x, 0.0, None)
+        weights /= weights.sum()
+        if len(active) == n:
+            return weights
+        _, grad = objective(weights)
+        held = weights > 1e-8
+        multipliers = np.linalg.lstsq(rows[:, held].T, grad[held], rcond=None)[0]
+        reduced = grad - rows.T @ multipliers
+        reduced[active] = 0.0
+        entering = np.flatnonzero(reduced < -1e-6 * np.abs(grad).max())
+        if not len(entering):
+            return weights
+        active = np.union1d(active, entering)
+        start = weights
+
+def _variance(cov):
+    def objective(w):
+        cw = cov @ w
+        return w @ cw, 2 * cw
+    return objective
+
+# Lowest-variance portfolio, starting from the least volatile assets
+def min_variance(mu, cov, start=None):
+    active = np.argsort(np.diag(cov))[:20]
+    return _solve(_variance(cov), len(mu), start, active=active)
+
+# Maximize (w.mu - rf) / sqrt(w'Cw) by minimizing its negative, starting from
+# the min-variance holdings plus the assets with the best stand-alone Sharpe
+def max_sharpe(mu, cov, risk_free=0.0, start=None):
+    excess = mu - risk_free
+    def objective(w):
+        cw = cov @ w
+        vol = np.sqrt(max(w @ cw, 1e-18))
+        ret = w @ excess
+        return -ret / vol, -(excess * vol - ret * cw / vol) / vol ** 2
+    active = np.argsort(-excess / np.sqrt(np.diag(cov)))[:10]
+    if start is not None:
+        active = np.union1d(active, np.flatnonzero(start > 1e-8))
+    return _solve(objective, len(mu), start, active=active)
+
+# Minimum-variance portfolios for evenly spaced target returns between the
+# min-variance return and the best single asset. Each solve starts from the
+# previous point's holdings (plus the best asset, which the last point needs).
+def efficient_frontier(mu, cov, points=FRONTIER_POINTS, start=None):
+    start = min_variance(mu, cov) if start is None else start
+    targets = np.linspace(float(start @ mu), float(mu.max()), points)
+    frontier = []
+    weights = start
+    for target in targets:
+        active = np.append(np.flatnonzero(weights > 1e-8), np.argmax(mu))
+        weights = _solve(_variance(cov), len(mu), weights, [(mu, target)], active)
+        frontier.append(weights)
+    return np.array(frontier)
+
+# Efficient frontier plus min-variance and max-Sharpe portfolios for a set of
+# symbols (returns, volatilities and risk-free rate are annual). Symbols
+# without enough history are listed under "missing".
+def optimize_portfolio(symbols, risk_free=0.0, years=LOOKBACK_YEARS, points=FRONTIER_POINTS):
+    kept, mu, cov = return_moments(symbols, years)
+    result = {"symbols": kept, "missing": sorted(set(symbols) - set(kept)), "risk_free": risk_free}
+    if not kept:
+        return result
+    min_var = min_variance(mu, cov)
+    best = max_sharpe(mu, cov, risk_free, min_var)
+    frontier = efficient_frontier(mu, cov, points, min_var)
+    result["min_variance"] = {"weights": min_var, "performance": portfolio_performance(min_var, mu, cov, risk_free)}
+    result["max_sharpe"] = {"weights": best, "performance": portfolio_performance(best, mu, cov, risk_free)}
+    result["frontier"] = [portfolio_performance(w, mu, cov, risk_free) for w in frontier]
+    result["assets"] = [(float(m), float(np.sqrt(v))) for m, v in zip(mu, np.diag(cov))]
+    return result
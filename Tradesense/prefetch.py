@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import Counter
+from market_cache import set_cached_history
+from market_data import intraday_series
+from quotes import quote_engine
+from ticker_info import get_info
+
+# Background warmer: keeps quotes, intraday bars and info for popular symbols
+# in the shared caches so page loads almost never pay for a fetch.
+PREFETCH_INTERVAL = 25       # seconds between refresh cycles (1m bars expire after 30s)
+USER_SCAN_INTERVAL = 300     # seconds between rescans of the user store
+BATCH_SIZE = 25              # symbols per batched download
+MAX_SYMBOLS_PER_CYCLE = 200  # most popular symbols refreshed each cycle
+
+# Rank symbols by how many users watch or hold them; fixed lists count once
+def rank_symbols(users, extra_symbols=()):
+    counts = Counter()
+    for user in users.values():
+        symbols = set(user.get("watchlist", [])) | set(user.get("portfolio", {}))
+        counts.update(symbol for symbol in symbols if symbol)
+    for symbol in extra_symbols:
+        counts[symbol] += 1
+    return [symbol for symbol, _ in counts.most_common()]
+
+class Prefetcher:
+    def __init__(self, load_users, extra_symbols=(), interval=PREFETCH_INTERVAL):
+        self.load_users = load_users
+        self.extra_symbols = list(extra_symbols)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._ranked = []
+        self._last_scan = 0
+        self.cycles = 0
+        self.errors = 0
+        self.last_cycle_seconds = 0.0
+
+    def _rescan(self):
+        if self._ranked and time.time() - self._last_scan < USER_SCAN_INTERVAL:
+            return
+        try:
+            users = self.load_users()
+        except Exception:
+            users = {}
+        self._ranked = rank_symbols(users, self.extra_symbols)[:MAX_SYMBOLS_PER_CYCLE]
+        self._last_scan = time.time()
+
+    def run_once(self):
+        start = time.time()
+        self._rescan()
+        for i in range(0, len(self._ranked), BATCH_SIZE):
+            if self._stop.is_set():
+                break
+            batch = self._ranked[i:i + BATCH_SIZE]
+            try:
+                quote_engine.refresh(batch)
+                for symbol, df in intraday_series.refresh_many(batch, period="1d").items():
+                    if not df.empty:
+                        set_cached_history(symbol, "1d", "1m", df)
+                for symbol in batch:
+                    get_info(symbol)
+            except Exception:
+                self.errors += 1
+        self.cycles += 1
+        self.last_cycle_seconds = time.time() - start
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(max(self.interval - self.last_cycle_seconds, 1))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="tradesense-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "symbols": len(self._ranked),
+            "cycles": self.cycles,
+            "errors": self.errors,
+            "last_cycle_seconds": round(self.last_cycle_seconds, 3),
+            "running": self._thread is not None and self._thread.is_alive()
+        }
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+# Start the process-wide prefetcher once; later calls return the running instance.
+# Set TRADESENSE_PREFETCH=0 to disable it.
+def start_prefetcher(load_users, extra_symbols=()):
+    global _prefetcher
+    if os.environ.get("TRADESENSE_PREFETCH", "1") == "0":
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(load_users, extra_symbols)
+        _prefetcher.start()
+        return _prefetcher
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+from market_data import fetch_history
+
+TICK_INTERVAL = 1.0      # seconds between ticks
+QUEUE_SIZE = 120         # ticks buffered per subscriber before the oldest are dropped
+IDLE_TIMEOUT = 30        # subscribers that stop polling for this long are dropped
+RESEED_EVERY = 60        # ticks between re-reading the intraday volatility
+
+# One session's view of a symbol's ticks. Bounded: a slow reader loses the
+# oldest ticks rather than holding the producer back.
+class Subscription:
+    def __init__(self, bus, maxsize=QUEUE_SIZE):
+        self.bus = bus
+        self.symbol = bus.symbol
+        self._ticks = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.last_poll = time.time()
+        self.dropped = 0
+        self.closed = False
+
+    def _push(self, tick):
+        with self._cond:
+            if len(self._ticks) == self._ticks.maxlen:
+                self.dropped += 1
+            self._ticks.append(tick)
+            self._cond.notify()
+
+    # Wait up to `timeout` seconds for ticks, then return everything pending
+    def next_ticks(self, timeout=None):
+        with self._cond:
+            self.last_poll = time.time()
+            if not self._ticks and not self.closed:
+                self._cond.wait(timeout)
+            ticks = list(self._ticks)
+            self._ticks.clear()
+            return ticks
+
+    # Mark closed and wake any waiting reader; the bus has already dropped it
+    def _expire(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def close(self):
+        self._expire()
+        self.bus.unsubscribe(self)
+
+# Produces one simulated candle per tick for a symbol and fans it out to every
+# subscriber, so cost per symbol stays flat no matter how many sessions watch it.
+class PriceBus:
+    def __init__(self, symbol, interval=TICK_INTERVAL):
+        self.symbol = symbol
+        self.interval = interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_price = None
+        self.volatility = 0.5
+        self.ticks = 0
+
+    def subscribe(self, maxsize=QUEUE_SIZE):
+        sub = Subscription(self, maxsize)
+        with self._lock:
+            self._subscribers.add(sub)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"price-bus-{self.symbol}", daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _seed(self):
+        try:
+            data = fetch_history(self.symbol, period="1d", interval="1m")
+        except Exception:
+            data = None
+        if data is not None and not data.empty:
+            self.volatility = float((data["High"].max() - data["Low"].min()) * 0.05) or 0.5
+            if self.last_price is None:
+                self.last_price = float(data["Close"].iloc[-1])
+        if self.last_price is None:
+            self.last_price = 100.0
+
+    def _tick(self):
+        if self.ticks % RESEED_EVERY == 0:
+            self._seed()
+        volatility = self.volatility
+        new_open = self.last_price
+        new_close = new_open + np.random.uniform(-volatility * 0.3, volatility * 0.3)
+        self.last_price = new_close
+        self.ticks += 1
+        return {
+            "time": datetime.now(),
+            "open": new_open,
+            "high": new_open + np.random.uniform(0, volatility),
+            "low": new_open - np.random.uniform(0, volatility),
+            "close": new_close
+        }
+
+    def _run(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                idle = [sub for sub in self._subscribers if now - sub.last_poll > IDLE_TIMEOUT]
+                for sub in idle:
+                    self._subscribers.discard(sub)
+                    # Closed so the owning session resubscribes instead of polling an orphan
+                    sub._expire()
+                subscribers = list(self._subscribers)
+                if not subscribers:
+                    self._thread = None
+                    return
+            tick = self._tick()
+            for sub in subscribers:
+                sub._push(tick)
+            time.sleep(self.interval)
+
+_buses = {}
+_buses_lock = threading.Lock()
+
+def get_bus(symbol):
+    with _buses_lock:
+        if symbol not in _buses:
+            _buses[symbol] = PriceBus(symbol)
+        return _buses[symbol]
+
+def subscribe(symbol, maxsize=QUEUE_SIZE):
+    return get_bus(symbol).subscribe(maxsize)
+
+def bus_stats():
+    with _buses_lock:
+        return {
+            symbol: {"subscribers": bus.subscriber_count(), "ticks": bus.ticks, "last_price": bus.last_price}
+            for symbol, bus in _buses.items()
+        }
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import threading
+import time
+import pandas as pd
+import requests
+import yfinance as yf
+from bs4 import BeautifulSoup
+from gateway import gateway
+
+# Market-data providers. Every data function goes through get_provider(), so the
+# app can run against yfinance or against recorded fixtures with no network.
+#
+# Environment:
+#   TRADESENSE_PROVIDER        "yfinance" (default) or "replay"
+#   TRADESENSE_REPLAY_DIR      fixture directory for the replay provider
+#   TRADESENSE_REPLAY_LATENCY  simulated seconds per call for the replay provider
+
+# Normalize a yfinance news item (old flat or newer nested "content" layout)
+def _news_item(item):
+    content = item.get("content") or item
+    link = content.get("link") or (content.get("canonicalUrl") or {}).get("url") or "#"
+    return {"title": content.get("title", "No title available"), "link": link}
+
+def _get_page(url, headers):
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response
+
+# Live backend backed by yfinance. Every network call goes through the fetch
+# gateway's rate limits, retries and circuit breakers.
+class YFinanceProvider:
+    name = "yfinance"
+
+    def history(self, symbol, period=None, interval="1d", start=None):
+        stock = yf.Ticker(symbol)
+        if start is not None:
+            return gateway.call("yfinance", stock.history, start=start, interval=interval)
+        return gateway.call("yfinance", stock.history, period=period or "1mo", interval=interval)
+
+    def download(self, symbols, period="1d", interval="1m", start=None):
+        window = {"start": start} if start is not None else {"period": period}
+        return gateway.call(
+            "yfinance", yf.download,
+            symbols, interval=interval, group_by="ticker",
+            threads=True, progress=False, auto_adjust=False, **window
+        )
+
+    def info(self, symbol):
+        return gateway.call("yfinance", lambda: yf.Ticker(symbol).info) or {}
+
+    # Scrape the Yahoo Finance news page, falling back to yfinance's news feed
+    def news(self, symbol):
+        url = f"https://finance.yahoo.com/quote/{symbol}/news?p={symbol}"
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        news_items = []
+        try:
+            response = gateway.call("yahoo-web", _get_page, url, headers)
+            soup = BeautifulSoup(response.text, "html.parser")
+            for item in soup.find_all("li", class_="js-stream-content Pos(r)"):
+                title = item.find("h3").text if item.find("h3") else "No title available"
+                link = item.find("a")["href"] if item.find("a") else "#"
+                if not link.startswith("http"):
+                    link = "https://finance.yahoo.com" + link
+                news_items.append({"title": title, "link": link})
+        except Exception:
+            pass
+        if news_items:
+            return news_items
+        news = gateway.call("yfinance", lambda: yf.Ticker(symbol).news)
+        return [_news_item(item) for item in (news or [])]
+
+    def insider_transactions(self, symbol):
+        return gateway.call("yfinance", lambda: yf.Ticker(symbol).insider_transactions)
+
+# Slice recorded bars to what a live `period` request would have returned,
+# measured back from the last recorded bar.
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "3y": pd.DateOffset(years=3),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+def slice_period(df, period):
+    if df.empty or period in (None, "max"):
+        return df
+    last = df.index[-1]
+    if period.endswith("d") and period[:-1].isdigit():
+        days = pd.Index(df.index.normalize()).unique()[-int(period[:-1]):]
+        return df[df.index.normalize().isin(days)]
+    if period == "ytd":
+        return df[df.index.year == last.year]
+    offset = PERIOD_OFFSETS.get(period)
+    return df if offset is None else df[df.index > last - offset]
+
+# Offline backend serving recorded fixtures at a configurable latency.
+# Layout: <dir>/bars/<SYMBOL>_<interval>.parquet, <dir>/info/<SYMBOL>.json,
+#         <dir>/news/<SYMBOL>.json, <dir>/insider/<SYMBOL>.parquet
+class ReplayProvider:
+    name = "replay"
+
+    def __init__(self, fixture_dir, latency=0.0):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self._frames = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _wait(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _path(self, kind, name):
+        return os.path.join(self.fixture_dir, kind, name)
+
+    def _frame(self, kind, name):
+        path = self._path(kind, name)
+        with self._lock:
+            if path in self._frames:
+                return self._frames[path]
+        df = pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+        with self._lock:
+            self._frames[path] = df
+        return df
+
+    def _json(self, kind, symbol, default):
+        try:
+            with open(self._path(kind, f"{symbol.upper()}.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _window(self, df, period, start):
+        if start is not None and not df.empty:
+            start = pd.Timestamp(start)
+            if df.index.tz is not None and start.tz is None:
+                start = start.tz_localize(df.index.tz)
+            return df[df.index >= start]
+        return slice_period(df, period or "1mo")
+
+    def history(self, symbol, period=None, interval="1d", start=None):
+        self._wait()
+        df = self._frame("bars", f"{symbol.upper()}_{interval}.parquet")
+        return self._window(df, period, start)
+
+    def download(self, symbols, period="1d", interval="1m", start=None):
+        self._wait()
+        frames = {}
+        for symbol in symbols:
+            df = self._frame("bars", f"{symbol.upper()}_{interval}.parquet")
+            if not df.empty:
+                frames[symbol] = self._window(df, period, start)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1)
+
+    def info(self, symbol):
+        self._wait()
+        return self._json("info", symbol, {})
+
+    def news(self, symbol):
+        self._wait()
+        return self._json("news", symbol, [])
+
+    def insider_transactions(self, symbol):
+        self._wait()
+        df = self._frame("insider", f"{symbol.upper()}.parquet")
+        return None if df.empty else df
+
+def _provider_from_env():
+    if os.environ.get("TRADESENSE_PROVIDER", "yfinance").lower() == "replay":
+        fixture_dir = os.environ.get("TRADESENSE_REPLAY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures"))
+        latency = float(os.environ.get("TRADESENSE_REPLAY_LATENCY", "0"))
+        return ReplayProvider(fixture_dir, latency=latency)
+    return YFinanceProvider()
+
+_provider = _provider_from_env()
+
+def get_provider():
+    return _provider
+
+# Swap the process-wide provider (e.g. in a benchmark). Caches are not cleared.
+def set_provider(provider):
+    global _provider
+    _provider = provider
+
+# Record live data into a fixture directory the replay provider can serve
+def record_fixtures(symbols, fixture_dir, intervals=(("1d", "1m"), ("3y", "1d"))):
+    live = YFinanceProvider()
+    for kind in ("bars", "info", "news", "insider"):
+        os.makedirs(os.path.join(fixture_dir, kind), exist_ok=True)
+    for symbol in symbols:
+        symbol = symbol.upper()
+        for period, interval in intervals:
+            df = live.history(symbol, period=period, interval=interval)
+            if not df.empty:
+                df.to_parquet(os.path.join(fixture_dir, "bars", f"{symbol}_{interval}.parquet"))
+        with open(os.path.join(fixture_dir, "info", f"{symbol}.json"), "w") as f:
+            json.dump(live.info(symbol), f, default=str)
+        with open(os.path.join(fixture_dir, "news", f"{symbol}.json"), "w") as f:
+            json.dump(live.news(symbol), f, default=str)
+        insider = live.insider_transactions(symbol)
+        if insider is not None and not insider.empty:
+            insider.to_parquet(os.path.join(fixture_dir, "insider", f"{symbol}.parquet"))
+        print(f"{symbol}: recorded")
+
+# CLI: python providers.py AAPL MSFT --dir fixtures
+def main():
+    parser = argparse.ArgumentParser(description="Record replay fixtures from yfinance.")
+    parser.add_argument("tickers", nargs="+", help="Ticker symbols to record")
+    parser.add_argument("--dir", default="fixtures", help="Fixture directory")
+    args = parser.parse_args()
+    record_fixtures(args.tickers, args.dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import threading
+import time
+from market_cache import flight
+from market_data import download_frames
+
+# Quotes older than this are refreshed on the next lookup (seconds)
+QUOTE_TTL = 15
+
+# In-memory last-price book shared by every session in the process.
+# Stale symbols are refreshed together in one batched daily-bar download,
+# whose last close is the latest traded price during the session.
+class QuoteEngine:
+    def __init__(self, max_age=QUOTE_TTL):
+        self.max_age = max_age
+        self._quotes = {}  # symbol -> (price, updated_at)
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.symbols_refreshed = 0
+
+    def _stale(self, symbols, max_age):
+        now = time.time()
+        with self._lock:
+            return [
+                symbol for symbol in symbols
+                if symbol not in self._quotes or now - self._quotes[symbol][1] >= max_age
+            ]
+
+    # Concurrent refreshes of the same symbol set share one download
+    def refresh(self, symbols):
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return
+        flight.do(("quotes", tuple(sorted(symbols))), lambda: self._refresh(symbols))
+
+    def _refresh(self, symbols):
+        frames = download_frames(symbols, period="1d", interval="1d")
+        now = time.time()
+        with self._lock:
+            self.refreshes += 1
+            self.symbols_refreshed += len(symbols)
+            for symbol, df in frames.items():
+                if df.empty or "Close" not in df.columns:
+                    continue
+                closes = df["Close"].dropna()
+                if not closes.empty:
+                    self._quotes[symbol] = (float(closes.iloc[-1]), now)
+
+    # Record a price observed elsewhere (e.g. a fill) without a network call
+    def update(self, symbol, price):
+        with self._lock:
+            self._quotes[symbol] = (float(price), time.time())
+
+    def get_quotes(self, symbols, max_age=None):
+        symbols = [symbol.upper() for symbol in symbols if symbol]
+        stale = self._stale(symbols, self.max_age if max_age is None else max_age)
+        if stale:
+            self.refresh(stale)
+        with self._lock:
+            return {symbol: self._quotes[symbol][0] for symbol in symbols if symbol in self._quotes}
+
+    def get_quote(self, symbol, max_age=None):
+        return self.get_quotes([symbol], max_age=max_age).get(symbol.upper())
+
+    # Seconds since the symbol's price was last refreshed, or None if never quoted
+    def quote_age(self, symbol):
+        with self._lock:
+            quote = self._quotes.get(symbol.upper())
+        return None if quote is None else time.time() - quote[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "symbols": len(self._quotes),
+                "refreshes": self.refreshes,
+                "symbols_refreshed": self.symbols_refreshed
+            }
+
+quote_engine = QuoteEngine()
+
+def get_quote(symbol, max_age=None):
+    return quote_engine.get_quote(symbol, max_age=max_age)
+
+def get_quotes(symbols, max_age=None):
+    return quote_engine.get_quotes(symbols, max_age=max_age)
+
+def quote_age(symbol):
+    return quote_engine.quote_age(symbol)
@@ -0,0 +1,43 @@
+from market_cache import TTLCache, ttl_for_interval
+from market_data import INTRADAY_PERIODS, fetch_history
+
+# Timeframes derived from the cached 1-minute series, as pandas offsets
+RESAMPLE_RULES = {
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "1h": "60min",
+    "1d": "1D",
+}
+CHART_INTERVALS = ["1m"] + list(RESAMPLE_RULES)
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+# Aggregate raw 1m OHLCV bars to a coarser interval in one vectorized pass.
+# Intraday bins are anchored on the first bar (the session open), daily bins on midnight.
+def resample_bars(df, interval):
+    if interval == "1m" or df.empty:
+        return df
+    rule = RESAMPLE_RULES[interval]
+    agg = {column: how for column, how in OHLCV_AGG.items() if column in df.columns}
+    origin = "start_day" if interval == "1d" else "start"
+    out = df[list(agg)].resample(rule, label="left", closed="left", origin=origin).agg(agg)
+    return out.dropna(subset=["Open"])
+
+# Resampled frames are reused until the underlying 1m frame is refreshed
+derived_cache = TTLCache(max_entries=512, default_ttl=ttl_for_interval("1m"))
+
+# Bars for any chart interval, all derived from one cached 1m fetch per symbol
+def get_bars(symbol, interval="1m", period="1d"):
+    base = fetch_history(symbol, period=period, interval="1m")
+    if interval == "1m":
+        return base
+    key = (symbol, period, interval)
+    entry = derived_cache.get(key)
+    if entry is not None and entry[0] is base:
+        return entry[1]
+    out = resample_bars(base, interval)
+    derived_cache.set(key, (base, out))
+    return out
+
+def can_resample(period, interval):
+    return interval in RESAMPLE_RULES and period in INTRADAY_PERIODS
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import pandas as pd
+from market_cache import TTLCache
+from ohlcv_store import get_daily_history
+
+MIN_COVERAGE = 0.8  # symbols with fewer days of history than this share are left out
+
+# Aligned return matrices, reused for the rest of the day
+returns_cache = TTLCache(max_entries=256, default_ttl=6 * 3600)
+
+def _closes(symbol, years):
+    try:
+        df = get_daily_history(symbol, years=years)
+    except Exception:
+        return None
+    if df.empty or "Close" not in df.columns:
+        return None
+    closes = df["Close"]
+    index = closes.index.tz_localize(None) if closes.index.tz is not None else closes.index
+    return pd.Series(closes.to_numpy(), index=index.normalize())
+
+# Daily simple returns (dates x symbols) from the local daily store, on the
+# dates every kept symbol traded. Symbols with too little history are dropped;
+# callers compare the columns with what they asked for.
+# Cached per symbol set and calendar day.
+def returns_matrix(symbols, years=2):
+    symbols = tuple(sorted(set(symbols)))
+    key = (symbols, years, date.today().isoformat())
+    cached = returns_cache.get(key)
+    if cached is not None:
+        return cached
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        closes = dict(zip(symbols, pool.map(lambda symbol: _closes(symbol, years), symbols)))
+    closes = pd.DataFrame({symbol: c for symbol, c in closes.items() if c is not None}).sort_index()
+    if closes.empty:
+        returns = closes
+    else:
+        returns = closes.pct_change(fill_method=None).iloc[1:]
+        returns = returns.loc[:, returns.notna().mean() >= MIN_COVERAGE].dropna()
+    returns_cache.set(key, returns)
+    return returns
@@ -0,0 +1,81 @@
+import hashlib
+import json
+from datetime import date
+from statistics import NormalDist
+import numpy as np
+from market_cache import TTLCache
+from returns import returns_matrix
+
+HORIZONS = (1, 10)   # trading days
+LOOKBACK_YEARS = 2
+RISK_TTL = 300       # dollar figures follow prices, so results are reused for 5 minutes
+
+risk_cache = TTLCache(max_entries=512, default_ttl=RISK_TTL)
+
+# Overlapping h-day compounded returns from daily returns, via cumulative log returns
+def horizon_returns(daily, horizon):
+    if horizon == 1:
+        return daily
+    cum = np.vstack([np.zeros((1, daily.shape[1])), np.cumsum(np.log1p(daily), axis=0)])
+    return np.expm1(cum[horizon:] - cum[:-horizon])
+
+# Historical simulation: revalue today's positions under every past scenario at once
+def historical_var(daily, values, confidence, horizon):
+    pnl = horizon_returns(daily, horizon) @ values
+    if not len(pnl):
+        return 0.0, 0.0
+    var = -np.quantile(pnl, 1 - confidence)
+    tail = pnl[pnl <= -var]
+    cvar = -tail.mean() if len(tail) else var
+    return float(max(var, 0.0)), float(max(cvar, 0.0))
+
+# Variance-covariance (normal) VaR and CVaR, scaled by the square root of time
+def parametric_var(daily, values, confidence, horizon):
+    if len(daily) < 2:
+        return 0.0, 0.0
+    mean = float(daily.mean(axis=0) @ values) * horizon
+    sd = float(np.sqrt(values @ np.cov(daily, rowvar=False).reshape(len(values), len(values)) @ values * horizon))
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - confidence)
+    var = -(mean + z * sd)
+    cvar = -(mean - sd * normal.pdf(z) / (1 - confidence))
+    return max(var, 0.0), max(cvar, 0.0)
+
+METHODS = {"historical": historical_var, "parametric": parametric_var}
+
+def portfolio_hash(quantities, confidence, method, years):
+    payload = json.dumps([sorted(quantities.items()), confidence, method, years, date.today().isoformat()])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+# 1-day and 10-day VaR/CVaR in dollars (losses as positive numbers) for the
+# given positions, valued at `prices`. Results are cached per portfolio hash.
+def portfolio_risk(portfolio, prices, confidence=0.95, method="historical", years=LOOKBACK_YEARS):
+    quantities = {symbol: details["quantity"] for symbol, details in portfolio.items() if details["quantity"]}
+    key = portfolio_hash(quantities, confidence, method, years)
+    cached = risk_cache.get(key)
+    if cached is not None:
+        return cached
+    returns = returns_matrix(list(quantities), years)
+    symbols = list(returns.columns)
+    values = np.array([quantities[s] * prices.get(s, 0.0) for s in symbols], dtype=np.float64)
+    daily = returns.to_numpy()
+    total = float(values.sum())
+    result = {
+        "method": method,
+        "confidence": confidence,
+        "observations": len(returns),
+        "start": returns.index[0].date() if len(returns) else None,
+        "value": total,
+        "missing": sorted(set(quantities) - set(symbols)),
+        "horizons": {}
+    }
+    for horizon in HORIZONS:
+        var, cvar = METHODS[method](daily, values, confidence, horizon) if len(symbols) else (0.0, 0.0)
+        result["horizons"][horizon] = {
+            "var": var,
+            "cvar": cvar,
+            "var_pct": var / total if total else 0.0,
+            "cvar_pct": cvar / total if total else 0.0
+        }
+    risk_cache.set(key, result)
+    return result
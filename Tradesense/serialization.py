@@ -0,0 +1,123 @@
+import json
+import os
+import struct
+from datetime import datetime, timezone
+
+# On-disk formats for the file user store (profiles, trade journals, snapshots).
+# Records always reach the app in the users.json shape, with transaction times
+# as "YYYY-mm-dd HH:MM:SS" strings. Codecs with native datetimes store them as
+# timestamps and convert at the boundary.
+USER_FORMAT = os.environ.get("TRADESENSE_USER_FORMAT", "json")
+
+# Newline-delimited JSON via the stdlib: human-readable and dependency-free
+class JsonCodec:
+    name = "json"
+    extension = ".json"
+    log_extension = ".log"
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def frame(self, payload):
+        return payload + b"\n"
+
+    # Yield (record, size) for each complete frame; stop at a torn or corrupt one
+    def read_frames(self, f):
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = self.loads(line)
+            except ValueError:
+                return
+            yield record, len(line)
+
+    def pack_transaction(self, transaction):
+        return transaction
+
+    def unpack_transaction(self, transaction):
+        return transaction
+
+# Same layout as JsonCodec, parsed and written by orjson
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+# Compact binary records, length-prefixed in the journal. Transaction times are
+# msgpack timestamps: the wall-clock time, labelled UTC so it round-trips exactly.
+class MsgpackCodec:
+    name = "msgpack"
+    extension = ".msgpack"
+    log_extension = ".msgpack"
+    _header = struct.Struct(">I")
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True, datetime=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False, timestamp=3)
+
+    def frame(self, payload):
+        return self._header.pack(len(payload)) + payload
+
+    def read_frames(self, f):
+        while True:
+            header = f.read(self._header.size)
+            if len(header) < self._header.size:
+                return
+            (size,) = self._header.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            try:
+                record = self.loads(payload)
+            except Exception:
+                return
+            yield record, self._header.size + size
+
+    def pack_transaction(self, transaction):
+        packed = dict(transaction)
+        packed["time"] = datetime.fromisoformat(transaction["time"]).replace(tzinfo=timezone.utc)
+        return packed
+
+    def unpack_transaction(self, transaction):
+        if isinstance(transaction.get("time"), datetime):
+            transaction = dict(transaction)
+            transaction["time"] = transaction["time"].replace(tzinfo=None).isoformat(" ")
+        return transaction
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec, "msgpack": MsgpackCodec}
+
+def get_codec(name=USER_FORMAT):
+    if name not in CODECS:
+        raise ValueError(f"Unknown user store format {name!r}; choose from {', '.join(CODECS)}")
+    try:
+        return CODECS[name]()
+    except ImportError:
+        raise ValueError(f"User store format {name!r} needs the {name} package installed")
+
+def available_codecs():
+    names = []
+    for name in CODECS:
+        try:
+            get_codec(name)
+            names.append(name)
+        except ValueError:
+            pass
+    return names
@@ -0,0 +1,135 @@
+LOT_METHODS = ("FIFO", "LIFO", "Specific lots")
+
+def new_lot_state():
+    return {"next_lot": 1, "lots": {}, "open": {}, "realized": {}}
+
+# Tax-lot ledger for one user. Every Buy opens a lot. A Sell closes lots FIFO,
+# LIFO or by explicit lot id. Realized P&L is updated as each sale is applied,
+# and open quantity and cost are kept per symbol, so unrealized P&L never
+# rescans the trade history.
+# Lot ids are the Buy's ordinal in the user's history, so replaying the same
+# transactions always yields the same ids. Each Sell records the lots it
+# closed in transaction["lots"] as [[lot_id, quantity], ...]; older Sells
+# without that field replay as FIFO.
+# All of the book lives in `state`, a plain dict the user stores persist as is
+# (see new_lot_state), so a book is rebuilt without replaying any history.
+class LotBook:
+    def __init__(self, state=None):
+        self.state = new_lot_state() if state is None else state
+        self.lots = self.state["lots"]          # symbol -> [[lot_id, quantity, price, time], ...], oldest first
+        self.realized = self.state["realized"]  # symbol -> realized P&L
+        self.open = self.state["open"]          # symbol -> [open quantity, open cost]
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        book = cls()
+        for transaction in transactions:
+            book.apply(transaction)
+        return book
+
+    def open_quantity(self, symbol):
+        return self.open.get(symbol, (0, 0.0))[0]
+
+    def open_cost(self, symbol):
+        return self.open.get(symbol, (0, 0.0))[1]
+
+    def buy(self, symbol, quantity, price, time=""):
+        lot_id = self.state["next_lot"]
+        self.state["next_lot"] += 1
+        self.lots.setdefault(symbol, []).append([lot_id, quantity, price, time])
+        position = self.open.setdefault(symbol, [0, 0.0])
+        position[0] += quantity
+        position[1] += quantity * price
+        return lot_id
+
+    # Choose the lots a sale of `quantity` shares closes, without changing the book.
+    # Raises ValueError if the lots cannot cover the sale, unless `partial` is set
+    # (shares bought before lots were tracked have no lot to close).
+    def allocate(self, symbol, quantity, method="FIFO", lot_ids=None, partial=False):
+        lots = self.lots.get(symbol, [])
+        if method == "LIFO":
+            candidates = reversed(lots)
+        elif method == "Specific lots":
+            chosen = {lot_id: i for i, lot_id in enumerate(lot_ids or [])}
+            candidates = sorted((lot for lot in lots if lot[0] in chosen), key=lambda lot: chosen[lot[0]])
+        else:
+            candidates = iter(lots)
+        allocation = []
+        remaining = quantity
+        for lot_id, lot_quantity, _, _ in candidates:
+            if remaining <= 0:
+                break
+            take = min(lot_quantity, remaining)
+            allocation.append([lot_id, take])
+            remaining -= take
+        if remaining > 0 and not partial:
+            raise ValueError(f"Selected lots hold fewer than {quantity} shares of {symbol}")
+        return allocation
+
+    # Close lots per `allocation` at `price`; returns this sale's realized P&L
+    def sell(self, symbol, allocation, price):
+        lots = self.lots.get(symbol, [])
+        by_id = {lot[0]: lot for lot in lots}
+        realized = 0.0
+        for lot_id, quantity in allocation:
+            lot = by_id[lot_id]
+            realized += quantity * (price - lot[2])
+            lot[1] -= quantity
+            self.open[symbol][0] -= quantity
+            self.open[symbol][1] -= quantity * lot[2]
+        if any(lot[1] <= 0 for lot in lots):
+            lots[:] = [lot for lot in lots if lot[1] > 0]
+        if symbol in self.lots and not self.lots[symbol]:
+            del self.lots[symbol]
+            self.open.pop(symbol, None)
+        self.realized[symbol] = self.realized.get(symbol, 0.0) + realized
+        return realized
+
+    # Fit a sale's requested allocation to the lots as they stand now. The
+    # request may be stale (chosen in another session before other sales) or
+    # absent (older Sells), so each entry is capped at what its lot still holds
+    # and shares left over come from the oldest open lots. Never allocates more
+    # than is open.
+    def reconcile(self, symbol, quantity, allocation=None):
+        lots = self.lots.get(symbol, [])
+        left_in_lot = {lot[0]: lot[1] for lot in lots}
+        taken = {}
+        remaining = quantity
+        requested = [(lot_id, lot_quantity) for lot_id, lot_quantity in allocation or []]
+        for lot_id, lot_quantity in requested + [(lot[0], lot[1]) for lot in lots]:
+            take = min(lot_quantity, left_in_lot.get(lot_id, 0), remaining)
+            if take > 0:
+                taken[lot_id] = taken.get(lot_id, 0) + take
+                left_in_lot[lot_id] -= take
+                remaining -= take
+        return [[lot_id, take] for lot_id, take in taken.items()]
+
+    # Apply one stored Buy/Sell transaction; returns the realized P&L (0 for buys).
+    # History that sells more than it bought (hand-edited legacy data) closes
+    # whatever is open rather than failing the replay.
+    def apply(self, transaction):
+        symbol = transaction["symbol"]
+        if transaction["action"] == "Buy":
+            self.buy(symbol, transaction["quantity"], transaction["price"], transaction.get("time", ""))
+            return 0.0
+        allocation = self.reconcile(symbol, transaction["quantity"], transaction.get("lots"))
+        if not allocation:
+            return 0.0
+        return self.sell(symbol, allocation, transaction["price"])
+
+    def open_lots(self, symbol):
+        return [
+            {"lot": lot_id, "quantity": quantity, "price": price, "time": time}
+            for lot_id, quantity, price, time in self.lots.get(symbol, ())
+        ]
+
+    # Unrealized P&L per symbol at the given prices, from the per-symbol aggregates
+    def unrealized(self, prices):
+        return {
+            symbol: quantity * prices[symbol] - cost
+            for symbol, (quantity, cost) in self.open.items()
+            if symbol in prices
+        }
+
+    def realized_total(self):
+        return sum(self.realized.values())
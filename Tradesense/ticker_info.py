@@ -0,0 +1,82 @@
+import json
+import os
+import time
+from fileutil import atomic_write
+from market_cache import TTLCache, flight
+from providers import get_provider
+
+# Ticker.info dicts are cached in memory and as one JSON file per ticker
+INFO_DIR = os.environ.get("TRADESENSE_INFO_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "info"))
+INFO_TTL = 24 * 3600
+
+info_cache = TTLCache(max_entries=2048, default_ttl=INFO_TTL)
+
+def _path(symbol):
+    return os.path.join(INFO_DIR, f"{symbol.upper()}.json")
+
+def _load_from_disk(symbol, max_age=INFO_TTL):
+    try:
+        with open(_path(symbol), "r") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None, 0
+    age = time.time() - record.get("fetched_at", 0)
+    if age >= max_age:
+        return None, 0
+    return record.get("info", {}), INFO_TTL - age
+
+def _save_to_disk(symbol, info):
+    atomic_write(_path(symbol), json.dumps({"fetched_at": time.time(), "info": info}, default=str))
+
+# Full info dict for a ticker: memory, then disk, then one provider call.
+# The returned dict is shared between sessions and must not be mutated.
+def get_info(symbol):
+    symbol = symbol.upper()
+    info = info_cache.get(symbol)
+    if info is not None:
+        return info
+    info, ttl_left = _load_from_disk(symbol)
+    if info is not None:
+        info_cache.set(symbol, info, ttl=ttl_left)
+        return info
+    return flight.do(("info", symbol), lambda: _fetch_info(symbol))
+
+def _stale_info(symbol):
+    stale = info_cache.get_stale(symbol)
+    if stale is None:
+        stale, _ = _load_from_disk(symbol, max_age=float("inf"))
+    return stale
+
+# On failure, fall back to the last good info dict from memory or disk.
+# An empty dict (how yfinance reports throttling) is a failure too and is not
+# cached or written over a good file.
+def _fetch_info(symbol):
+    try:
+        info = get_provider().info(symbol) or {}
+    except Exception:
+        stale = _stale_info(symbol)
+        if stale is not None:
+            return stale
+        raise
+    if not info:
+        stale = _stale_info(symbol)
+        return info if stale is None else stale
+    info_cache.set(symbol, info)
+    try:
+        _save_to_disk(symbol, info)
+    except OSError:
+        pass
+    return info
+
+# One info field, with `default` for missing or null values
+def info_field(symbol, field, default=None):
+    value = get_info(symbol).get(field)
+    return default if value is None else value
+
+# Several info fields at once, in the order requested
+def info_fields(symbol, fields, default=None):
+    info = get_info(symbol)
+    return [default if info.get(field) is None else info.get(field) for field in fields]
+
+def company_name(symbol, default="Unknown Company", field="longName"):
+    return info_field(symbol, field, default)
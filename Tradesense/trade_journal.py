@@ -0,0 +1,133 @@
+import os
+import threading
+from fileutil import atomic_write
+from serialization import JsonCodec
+
+SNAPSHOT_EVERY = 500  # events between compacted snapshots
+
+# Append-only event log with periodic snapshots of the derived state.
+# Appends are one sequential write each. fsyncs are batched: concurrent
+# appenders wait on a single fsync that covers all of them (group commit).
+# Recovery loads the latest snapshot and replays only the journal tail
+# written after it. The full log stays on disk as a replayable audit trail.
+# Records are framed and encoded by `codec` (see serialization.py).
+class TradeJournal:
+    def __init__(self, directory, apply_event, snapshot_every=SNAPSHOT_EVERY, codec=None):
+        self.directory = directory
+        self.apply_event = apply_event
+        self.snapshot_every = snapshot_every
+        self.codec = codec or JsonCodec()
+        self.log_path = os.path.join(directory, "journal" + self.codec.log_extension)
+        self.snapshot_path = os.path.join(directory, "snapshot" + self.codec.extension)
+        self._lock = threading.Lock()
+        self._sync_cond = threading.Condition()
+        self._syncing = False
+        self._durable_seq = 0
+        self._written_seq = 0
+        self.fsyncs = 0
+        self.replayed = 0
+        os.makedirs(directory, exist_ok=True)
+        self.state, self.seq = self._recover()
+        self._durable_seq = self._written_seq = self.seq
+        self._since_snapshot = self.replayed
+        self._file = None  # opened on first append, so read-only use holds no descriptor
+
+    def _log(self):
+        if self._file is None:
+            self._file = open(self.log_path, "ab")
+        return self._file
+
+    # Snapshot state plus every complete journal record after the snapshot offset.
+    # A torn final record (crash mid-append) is cut off so later appends stay parseable.
+    def _recover(self):
+        state, seq, offset = {}, 0, 0
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = self.codec.loads(f.read())
+            state, seq, offset = snapshot["state"], snapshot["seq"], snapshot["offset"]
+        except Exception:
+            pass
+        if not os.path.exists(self.log_path):
+            return state, seq
+        good_end = offset
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            for event, size in self.codec.read_frames(f):
+                good_end += size
+                if event["seq"] <= seq:
+                    continue
+                self.apply_event(state, event)
+                seq = event["seq"]
+                self.replayed += 1
+        if good_end < os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_end)
+        return state, seq
+
+    # Append one event and apply it to the in-memory state. With durable=False
+    # the caller must sync(record["seq"]) itself, e.g. after releasing its own locks.
+    def append(self, event, durable=True):
+        with self._lock:
+            self.seq += 1
+            record = dict(event, seq=self.seq)
+            log = self._log()
+            log.write(self.codec.frame(self.codec.dumps(record)))
+            log.flush()
+            self.apply_event(self.state, record)
+            seq = self._written_seq = self.seq
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_every:
+                self._snapshot()
+        if durable:
+            self.sync(seq)
+        return record
+
+    # Block until every event up to `seq` is on disk
+    def sync(self, seq):
+        with self._sync_cond:
+            while self._durable_seq < seq:
+                if self._syncing:
+                    self._sync_cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written_seq
+                self._sync_cond.release()
+                try:
+                    os.fsync(self._file.fileno())
+                finally:
+                    self._sync_cond.acquire()
+                    self._syncing = False
+                    self._sync_cond.notify_all()
+                self.fsyncs += 1
+                self._durable_seq = max(self._durable_seq, target)
+
+    # Caller holds self._lock
+    def _snapshot(self):
+        log = self._log()
+        os.fsync(log.fileno())
+        snapshot = self.codec.dumps({"seq": self.seq, "offset": log.tell(), "state": self.state})
+        atomic_write(self.snapshot_path, snapshot, durable=True)
+        self._since_snapshot = 0
+
+    def snapshot(self):
+        with self._lock:
+            self._snapshot()
+
+    # Replay the whole log from the start, e.g. to rebuild history or audit it
+    def events(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            for event, _ in self.codec.read_frames(f):
+                yield event
+
+    def stats(self):
+        return {
+            "seq": self.seq,
+            "fsyncs": self.fsyncs,
+            "replayed_on_recovery": self.replayed,
+            "since_snapshot": self._since_snapshot
+        }
@@ -0,0 +1,953 @@
+import argparse
+import atexit
+import copy
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+from fileutil import atomic_write
+from serialization import CODECS, USER_FORMAT, get_codec
+from tax_lots import LotBook, new_lot_state
+from trade_journal import TradeJournal
+
+# User, portfolio and trade storage. Records are exchanged in the same shape
+# users.json has always used:
+#   {"password", "email", "balance", "portfolio": {symbol: {"quantity", "avg_price"}},
+#    "watchlist": [...], "transactions": [...], "price_alerts": [...],
+#    "lots": tax-lot state (see tax_lots.py)}
+USER_STORE_BACKEND = os.environ.get("TRADESENSE_USER_STORE", "sqlite")  # "sqlite" or "file" (per-user shards)
+USER_DB_FILE = os.environ.get("TRADESENSE_USER_DB", "users.db")
+USER_DIR = os.environ.get("TRADESENSE_USER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "users"))
+LEGACY_USER_FILE = "users.json"
+PROFILE_WRITE_DELAY = float(os.environ.get("TRADESENSE_PROFILE_WRITE_DELAY", "0.25"))  # seconds
+
+def new_user_record(password, email, balance=10000.0):
+    return {
+        "password": password,
+        "email": email,
+        "balance": balance,
+        "portfolio": {},
+        "watchlist": [],
+        "transactions": [],
+        "price_alerts": [],
+        "lots": new_lot_state()
+    }
+
+# A Sell's lot allocation checked against the stored lots (see LotBook.reconcile),
+# so what is recorded is what was actually closed. Other transactions pass through.
+def _reconcile_lots(lot_state, transaction):
+    if transaction["action"] != "Sell":
+        return transaction
+    allocation = LotBook(lot_state).reconcile(transaction["symbol"], transaction["quantity"], transaction.get("lots"))
+    transaction = dict(transaction)
+    if allocation:
+        transaction["lots"] = allocation
+    else:
+        transaction.pop("lots", None)
+    return transaction
+
+# Apply one Buy/Sell transaction to a user record in place, including its
+# tax-lot state when the record carries one ("lots").
+# Returns False (leaving the record untouched) if funds or shares are short.
+def apply_trade(user, transaction):
+    symbol = transaction["symbol"]
+    quantity = transaction["quantity"]
+    price = transaction["price"]
+    total = transaction["total"]
+    portfolio = user.setdefault("portfolio", {})
+    if transaction["action"] == "Buy":
+        if total > user["balance"]:
+            return False
+        user["balance"] -= total
+        if symbol in portfolio:
+            current_qty = portfolio[symbol]["quantity"]
+            current_avg = portfolio[symbol]["avg_price"]
+            portfolio[symbol]["quantity"] += quantity
+            portfolio[symbol]["avg_price"] = (current_avg * current_qty + price * quantity) / (current_qty + quantity)
+        else:
+            portfolio[symbol] = {"quantity": quantity, "avg_price": price}
+    else:
+        if symbol not in portfolio or portfolio[symbol]["quantity"] < quantity:
+            return False
+        position = portfolio[symbol]
+        position["quantity"] -= quantity
+        user["balance"] += total
+        if "lots" in user and position["quantity"]:
+            position["avg_price"] = _cost_after_sale(LotBook(user["lots"]), transaction, position)
+            return True
+        if position["quantity"] == 0:
+            del portfolio[symbol]
+    if "lots" in user:
+        LotBook(user["lots"]).apply(transaction)
+    return True
+
+# Apply a partial sale to the lot book and return the average cost of the shares
+# left. LIFO and specific-lot sales close lots at other than the average cost,
+# so the remaining lots set the new average. Shares bought before lots were
+# tracked have no lot; their part of the sale is taken out at their own average.
+def _cost_after_sale(book, transaction, position):
+    symbol = transaction["symbol"]
+    held = position["quantity"] + transaction["quantity"]
+    held_cost = held * position["avg_price"]
+    lot_quantity, lot_cost = book.open_quantity(symbol), book.open_cost(symbol)
+    book.apply(transaction)
+    if book.open_quantity(symbol) == position["quantity"] or held <= lot_quantity:
+        # Every share is in a lot (or the lots are out of step with the position)
+        if book.open_quantity(symbol):
+            return book.open_cost(symbol) / book.open_quantity(symbol)
+        return position["avg_price"]
+    untracked_avg = (held_cost - lot_cost) / (held - lot_quantity)
+    untracked_sold = transaction["quantity"] - (lot_quantity - book.open_quantity(symbol))
+    closed_cost = lot_cost - book.open_cost(symbol)
+    return (held_cost - closed_cost - untracked_sold * untracked_avg) / position["quantity"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL DEFAULT '',
+    balance REAL NOT NULL DEFAULT 0,
+    next_lot INTEGER
+);
+CREATE TABLE IF NOT EXISTS positions (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    symbol TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    avg_price REAL NOT NULL,
+    PRIMARY KEY (user_id, symbol)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    time TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    action TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    total REAL NOT NULL,
+    lots TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_time ON transactions(user_id, time);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_symbol_time ON transactions(user_id, symbol, time);
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    PRIMARY KEY (user_id, symbol)
+);
+CREATE TABLE IF NOT EXISTS price_alerts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    symbol TEXT NOT NULL,
+    target_price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tax_lots (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    lot_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    time TEXT NOT NULL,
+    PRIMARY KEY (user_id, lot_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tax_lots_user_symbol ON tax_lots(user_id, symbol, lot_id);
+CREATE TABLE IF NOT EXISTS realized_pnl (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    symbol TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (user_id, symbol)
+);
+"""
+
+# Sells record the tax lots they closed (see tax_lots.py) as a JSON column
+def _lots_column(transaction):
+    return json.dumps(transaction["lots"]) if transaction.get("lots") else None
+
+def _transaction_row(row):
+    transaction = dict(row)
+    lots = transaction.pop("lots", None)
+    if lots:
+        transaction["lots"] = json.loads(lots)
+    return transaction
+
+# SQLite store in WAL mode: readers never block the writer, and every change is
+# a small row-level transaction instead of a rewrite of every user's data.
+class SQLiteUserStore:
+    def __init__(self, path=USER_DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Databases created before tax-lot tracking lack the lots columns
+        if "lots" not in [row["name"] for row in conn.execute("PRAGMA table_info(transactions)")]:
+            conn.execute("ALTER TABLE transactions ADD COLUMN lots TEXT")
+        if "next_lot" not in [row["name"] for row in conn.execute("PRAGMA table_info(users)")]:
+            conn.execute("ALTER TABLE users ADD COLUMN next_lot INTEGER")
+        self._build_missing_lots()
+
+    # Users without lot rows yet (next_lot is NULL) get them from one replay of
+    # their history; afterwards record_trade keeps them current
+    def _build_missing_lots(self):
+        conn = self._conn()
+        pending = [row["id"] for row in conn.execute("SELECT id FROM users WHERE next_lot IS NULL")]
+        for user_id in pending:
+            with self._transaction() as conn:
+                transactions = [
+                    _transaction_row(t) for t in conn.execute(
+                        "SELECT time, symbol, action, quantity, price, total, lots FROM transactions WHERE user_id = ? ORDER BY id",
+                        (user_id,)
+                    )
+                ]
+                state = LotBook.from_transactions(transactions).state
+                self._write_lots(conn, user_id, state, list(state["lots"]) + list(state["realized"]))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write
+    # sequences (balance checks) cannot interleave with another writer.
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Lot state for one user (or only `symbol`'s lots), in new_lot_state's shape
+    def _lot_state(self, conn, user_id, symbol=None):
+        state = new_lot_state()
+        state["next_lot"] = conn.execute("SELECT next_lot FROM users WHERE id = ?", (user_id,)).fetchone()["next_lot"] or 1
+        where, params = ("user_id = ?", (user_id,)) if symbol is None else ("user_id = ? AND symbol = ?", (user_id, symbol))
+        for row in conn.execute(f"SELECT lot_id, symbol, quantity, price, time FROM tax_lots WHERE {where} ORDER BY lot_id", params):
+            state["lots"].setdefault(row["symbol"], []).append([row["lot_id"], row["quantity"], row["price"], row["time"]])
+            position = state["open"].setdefault(row["symbol"], [0, 0.0])
+            position[0] += row["quantity"]
+            position[1] += row["quantity"] * row["price"]
+        for row in conn.execute(f"SELECT symbol, amount FROM realized_pnl WHERE {where}", params):
+            state["realized"][row["symbol"]] = row["amount"]
+        return state
+
+    # Replace the stored lots and realized P&L of `symbols` with those in `state`
+    def _write_lots(self, conn, user_id, state, symbols):
+        for symbol in set(symbols):
+            conn.execute("DELETE FROM tax_lots WHERE user_id = ? AND symbol = ?", (user_id, symbol))
+            conn.executemany(
+                "INSERT INTO tax_lots (user_id, lot_id, symbol, quantity, price, time) VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, lot_id, symbol, quantity, price, time) for lot_id, quantity, price, time in state["lots"].get(symbol, [])]
+            )
+            if symbol in state["realized"]:
+                conn.execute(
+                    "INSERT OR REPLACE INTO realized_pnl (user_id, symbol, amount) VALUES (?, ?, ?)",
+                    (user_id, symbol, state["realized"][symbol])
+                )
+        conn.execute("UPDATE users SET next_lot = ? WHERE id = ?", (state["next_lot"], user_id))
+
+    def _user_id(self, conn, username):
+        row = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+        return None if row is None else row["id"]
+
+    def user_exists(self, username):
+        return self._user_id(self._conn(), username) is not None
+
+    # with_transactions=False skips the trade history; page through it with query_transactions
+    def get_user(self, username, with_transactions=True):
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        user_id = row["id"]
+        record = {
+            "password": row["password"],
+            "email": row["email"],
+            "balance": row["balance"],
+            "portfolio": {
+                p["symbol"]: {"quantity": p["quantity"], "avg_price": p["avg_price"]}
+                for p in conn.execute("SELECT symbol, quantity, avg_price FROM positions WHERE user_id = ?", (user_id,))
+            },
+            "watchlist": [
+                w["symbol"] for w in conn.execute("SELECT symbol FROM watchlist WHERE user_id = ? ORDER BY position", (user_id,))
+            ],
+            "price_alerts": [
+                dict(a) for a in conn.execute("SELECT symbol, target_price FROM price_alerts WHERE user_id = ? ORDER BY id", (user_id,))
+            ],
+            "lots": self._lot_state(conn, user_id)
+        }
+        if with_transactions:
+            record["transactions"] = [
+                _transaction_row(t) for t in conn.execute(
+                    "SELECT time, symbol, action, quantity, price, total, lots FROM transactions WHERE user_id = ? ORDER BY id",
+                    (user_id,)
+                )
+            ]
+        return record
+
+    # One page of a user's transactions, newest first by default, plus the total
+    # number matching. Filters and the time ordering are served by the
+    # (user_id, time) and (user_id, symbol, time) indexes.
+    def query_transactions(self, username, symbol=None, action=None, start=None, end=None, descending=True, offset=0, limit=50):
+        conn = self._conn()
+        user_id = self._user_id(conn, username)
+        if user_id is None:
+            return [], 0
+        where, params = ["user_id = ?"], [user_id]
+        for clause, value in (("symbol = ?", symbol), ("action = ?", action), ("time >= ?", start), ("time <= ?", end)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        where = " AND ".join(where)
+        total = conn.execute(f"SELECT COUNT(*) AS n FROM transactions WHERE {where}", params).fetchone()["n"]
+        order = "DESC" if descending else "ASC"
+        rows = conn.execute(
+            f"SELECT time, symbol, action, quantity, price, total, lots FROM transactions WHERE {where} "
+            f"ORDER BY time {order}, id {order} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [_transaction_row(row) for row in rows], total
+
+    def transaction_symbols(self, username):
+        rows = self._conn().execute(
+            "SELECT DISTINCT t.symbol FROM transactions t JOIN users u ON u.id = t.user_id WHERE u.username = ? ORDER BY t.symbol",
+            (username,)
+        )
+        return [row["symbol"] for row in rows]
+
+    # The password is checked against one indexed row before the full record is read
+    def authenticate(self, username, password):
+        row = self._conn().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None or row["password"] != password:
+            return None
+        return self.get_user(username, with_transactions=False)
+
+    def usernames(self):
+        return [row["username"] for row in self._conn().execute("SELECT username FROM users ORDER BY id")]
+
+    # Watchlists and positions only, for ranking symbols without reading any transactions
+    def load_holdings(self):
+        conn = self._conn()
+        holdings = {row["username"]: {"watchlist": [], "portfolio": {}} for row in conn.execute("SELECT username FROM users")}
+        for row in conn.execute("SELECT u.username, w.symbol FROM watchlist w JOIN users u ON u.id = w.user_id ORDER BY w.position"):
+            holdings[row["username"]]["watchlist"].append(row["symbol"])
+        for row in conn.execute("SELECT u.username, p.symbol, p.quantity, p.avg_price FROM positions p JOIN users u ON u.id = p.user_id"):
+            holdings[row["username"]]["portfolio"][row["symbol"]] = {"quantity": row["quantity"], "avg_price": row["avg_price"]}
+        return holdings
+
+    def load_all(self):
+        return {username: self.get_user(username) for username in self.usernames()}
+
+    # Returns False if the username is already taken
+    def create_user(self, username, record):
+        try:
+            with self._transaction() as conn:
+                self._write_user(conn, username, record)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def _write_user(self, conn, username, record):
+        cur = conn.execute(
+            "INSERT INTO users (username, password, email, balance) VALUES (?, ?, ?, ?)",
+            (username, record.get("password", ""), record.get("email", ""), record.get("balance", 0.0))
+        )
+        user_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO positions (user_id, symbol, quantity, avg_price) VALUES (?, ?, ?, ?)",
+            [(user_id, symbol, p["quantity"], p["avg_price"]) for symbol, p in record.get("portfolio", {}).items()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO watchlist (user_id, position, symbol) VALUES (?, ?, ?)",
+            [(user_id, i, symbol) for i, symbol in enumerate(record.get("watchlist", []))]
+        )
+        conn.executemany(
+            "INSERT INTO transactions (user_id, time, symbol, action, quantity, price, total, lots) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (user_id, t["time"], t["symbol"], t["action"], t["quantity"], t["price"], t["total"], _lots_column(t))
+                for t in record.get("transactions", [])
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO price_alerts (user_id, symbol, target_price) VALUES (?, ?, ?)",
+            [(user_id, a["symbol"], a["target_price"]) for a in record.get("price_alerts", [])]
+        )
+        # Records from users.json have no lot state yet; it comes from their history
+        lots = record.get("lots") or LotBook.from_transactions(record.get("transactions", [])).state
+        self._write_lots(conn, user_id, lots, list(lots["lots"]) + list(lots["realized"]))
+
+    # Apply a Buy/Sell atomically: balance, position, tax lots and transaction
+    # row change together or not at all. Returns False if funds or shares are short.
+    def record_trade(self, username, transaction):
+        symbol = transaction["symbol"]
+        with self._transaction() as conn:
+            user_id = self._user_id(conn, username)
+            if user_id is None:
+                return False
+            balance = conn.execute("SELECT balance FROM users WHERE id = ?", (user_id,)).fetchone()["balance"]
+            row = conn.execute(
+                "SELECT quantity, avg_price FROM positions WHERE user_id = ? AND symbol = ?", (user_id, symbol)
+            ).fetchone()
+            state = {"balance": balance, "portfolio": {}, "lots": self._lot_state(conn, user_id, symbol)}
+            transaction = _reconcile_lots(state["lots"], transaction)
+            if row is not None:
+                state["portfolio"][symbol] = {"quantity": row["quantity"], "avg_price": row["avg_price"]}
+            if not apply_trade(state, transaction):
+                return False
+            conn.execute("UPDATE users SET balance = ? WHERE id = ?", (state["balance"], user_id))
+            position = state["portfolio"].get(symbol)
+            if position is None:
+                conn.execute("DELETE FROM positions WHERE user_id = ? AND symbol = ?", (user_id, symbol))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO positions (user_id, symbol, quantity, avg_price) VALUES (?, ?, ?, ?)",
+                    (user_id, symbol, position["quantity"], position["avg_price"])
+                )
+            self._write_lots(conn, user_id, state["lots"], [symbol])
+            conn.execute(
+                "INSERT INTO transactions (user_id, time, symbol, action, quantity, price, total, lots) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, transaction["time"], symbol, transaction["action"], transaction["quantity"], transaction["price"], transaction["total"], _lots_column(transaction))
+            )
+        return True
+
+    def add_to_watchlist(self, username, symbol):
+        with self._transaction() as conn:
+            user_id = self._user_id(conn, username)
+            if user_id is None:
+                return False
+            next_position = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) AS n FROM watchlist WHERE user_id = ?", (user_id,)
+            ).fetchone()["n"]
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO watchlist (user_id, position, symbol) VALUES (?, ?, ?)", (user_id, next_position, symbol)
+            )
+            return cur.rowcount > 0
+
+    def set_price_alerts(self, username, alerts):
+        with self._transaction() as conn:
+            user_id = self._user_id(conn, username)
+            if user_id is None:
+                return False
+            conn.execute("DELETE FROM price_alerts WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO price_alerts (user_id, symbol, target_price) VALUES (?, ?, ?)",
+                [(user_id, a["symbol"], a["target_price"]) for a in alerts]
+            )
+        return True
+
+    def update_profile(self, username, email=None, password=None):
+        with self._transaction() as conn:
+            if email:
+                conn.execute("UPDATE users SET email = ? WHERE username = ?", (email, username))
+            if password:
+                conn.execute("UPDATE users SET password = ? WHERE username = ?", (password, username))
+
+    # Full replace of the given users, for bulk imports and tools
+    def save_all(self, users):
+        with self._transaction() as conn:
+            for username, record in users.items():
+                conn.execute("DELETE FROM users WHERE username = ?", (username,))
+                self._write_user(conn, username, record)
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+# Journal reducer: balances, positions and tax lots per user. Lot state rides
+# in the snapshot, so recovery never replays more than the journal tail.
+# `unpack` turns stored transactions back into plain ones (see serialization.py).
+def apply_journal_event(state, event, unpack=None):
+    unpack = unpack or (lambda transaction: transaction)
+    username = event["user"]
+    if event["type"] == "open":
+        lots = event.get("lots")
+        if lots is None:
+            lots = LotBook.from_transactions(unpack(t) for t in event.get("transactions", [])).state
+        state[username] = {"balance": event["balance"], "portfolio": copy.deepcopy(event["portfolio"]), "lots": copy.deepcopy(lots)}
+    elif event["type"] == "trade":
+        apply_trade(state[username], unpack(event["transaction"]))
+
+def _profile_of(record):
+    return {
+        "password": record.get("password", ""),
+        "email": record.get("email", ""),
+        "watchlist": list(record.get("watchlist", [])),
+        "price_alerts": list(record.get("price_alerts", []))
+    }
+
+# Debounces repeated writes of the same key: a burst of updates within `delay`
+# seconds turns into one write of the latest state. Writes of one key never
+# overlap (the newest state always lands last), and flush() returns only once
+# no write is in flight, so nothing is cut off at interpreter exit.
+class WriteCoalescer:
+    def __init__(self, delay=PROFILE_WRITE_DELAY):
+        self.delay = delay
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._key_locks = {}
+        self.requested = 0
+        self.written = 0
+
+    def schedule(self, key, write):
+        with self._lock:
+            self.requested += 1
+            if key in self._pending:
+                return
+            timer = threading.Timer(self.delay, self._run, (key,))
+            timer.daemon = True
+            self._pending[key] = (write, timer)
+        timer.start()
+
+    def _run(self, key):
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                return
+            self._in_flight += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                entry[0]()
+        finally:
+            with self._lock:
+                self.written += 1
+                self._in_flight -= 1
+                self._idle.notify_all()
+
+    # Write everything still pending now and wait for writes already running
+    # (shutdown, tests, tools)
+    def flush(self):
+        with self._lock:
+            keys = list(self._pending)
+            for write, timer in self._pending.values():
+                timer.cancel()
+        for key in keys:
+            self._run(key)
+        with self._lock:
+            while self._in_flight:
+                self._idle.wait()
+
+    def stats(self):
+        return {"requested": self.requested, "written": self.written, "pending": len(self._pending)}
+
+# <root>/<2 hex chars of sha1>/u_<quoted username>: a fixed fan-out keeps
+# directories small, and quoting keeps any username a single safe path component.
+def _shard_dir(root, username):
+    bucket = hashlib.sha1(username.encode("utf-8")).hexdigest()[:2]
+    return os.path.join(root, bucket, "u_" + quote(username, safe=""))
+
+# Sorted views over one user's transactions for filtered, paginated queries.
+# Times are fixed-width "YYYY-mm-dd HH:MM:SS" strings, so they bisect as text.
+# Trades arrive in time order, so add() is an append in practice.
+class TransactionIndex:
+    def __init__(self, transactions=()):
+        self.rows = []
+        self._all = ([], [])  # (times, row numbers) in time order
+        self._by_symbol = {}
+        for transaction in transactions:
+            self.add(transaction)
+
+    def add(self, transaction):
+        i = len(self.rows)
+        self.rows.append(transaction)
+        for times, positions in (self._all, self._by_symbol.setdefault(transaction["symbol"], ([], []))):
+            k = bisect_right(times, transaction["time"])
+            times.insert(k, transaction["time"])
+            positions.insert(k, i)
+
+    def query(self, symbol=None, action=None, start=None, end=None, descending=True, offset=0, limit=50):
+        times, positions = self._all if symbol is None else self._by_symbol.get(symbol, ([], []))
+        lo = bisect_left(times, start) if start else 0
+        hi = bisect_right(times, end) if end else len(times)
+        if action:
+            window = [i for i in positions[lo:hi] if self.rows[i]["action"] == action]
+            lo, hi, positions = 0, len(window), window
+        total = max(hi - lo, 0)
+        if descending:
+            page = positions[max(hi - offset - limit, lo):max(hi - offset, lo)][::-1]
+        else:
+            page = positions[lo + offset:min(lo + offset + limit, hi)]
+        return [dict(self.rows[i]) for i in page], total
+
+    def symbols(self):
+        return sorted(self._by_symbol)
+
+# One user's files: a profile plus that user's own trade journal and snapshot,
+# all in the store's codec format
+class UserShard:
+    def __init__(self, username, directory, codec):
+        self.username = username
+        self.directory = directory
+        self.codec = codec
+        self.profile_path = os.path.join(directory, "profile" + codec.extension)
+        self.lock = threading.Lock()
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._index = None
+        try:
+            with open(self.profile_path, "rb") as f:
+                self.profile = codec.loads(f.read())
+        except Exception:
+            self.profile = None
+
+    @property
+    def journal(self):
+        with self._journal_lock:
+            if self._journal is None:
+                apply_event = functools.partial(apply_journal_event, unpack=self.codec.unpack_transaction)
+                self._journal = TradeJournal(self.directory, apply_event, codec=self.codec)
+            return self._journal
+
+    # Caller holds self.lock
+    def position(self):
+        state = self.journal.state.get(self.username)
+        if state is None:
+            return {"balance": 0.0, "portfolio": {}, "lots": new_lot_state()}
+        if "lots" not in state:
+            # Journals written before lot tracking: build the lots once and snapshot them
+            state["lots"] = LotBook.from_transactions(self.transactions()).state
+            self.journal.snapshot()
+        return state
+
+    def write_profile(self):
+        with self.lock:
+            data = self.codec.dumps(self.profile)
+        atomic_write(self.profile_path, data)
+
+    def transactions(self):
+        unpack = self.codec.unpack_transaction
+        transactions = []
+        for event in self.journal.events():
+            if event["type"] == "open":
+                transactions = [unpack(t) for t in event.get("transactions", [])]
+            elif event["type"] == "trade":
+                transactions.append(unpack(event["transaction"]))
+        return transactions
+
+    # Built from the journal on first query, then kept current by record_trade
+    @property
+    def index(self):
+        with self.lock:
+            if self._index is None:
+                self._index = TransactionIndex(self.transactions())
+            return self._index
+
+# File-backed store without a database, sharded per user. Each user has their
+# own directory, lock and trade journal, so trades, alert checks and watchlist
+# edits for different users never contend or rewrite each other's bytes.
+# Profile edits are coalesced into one atomic temp-file-plus-rename write.
+class ShardedUserStore:
+    def __init__(self, directory=USER_DIR, write_delay=PROFILE_WRITE_DELAY, codec=None):
+        self.directory = directory
+        self.codec = codec or get_codec(USER_FORMAT)
+        self.coalescer = WriteCoalescer(write_delay)
+        self._lock = threading.Lock()
+        self._shards = {}
+        os.makedirs(directory, exist_ok=True)
+        self._index = self._scan()
+
+    # username -> shard directory, from the directory names alone.
+    # Shards written in another format are refused rather than silently skipped.
+    def _scan(self):
+        index = {}
+        profile_name = "profile" + self.codec.extension
+        other_names = {"profile" + cls.extension for cls in CODECS.values()} - {profile_name}
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if not entry.name.startswith("u_"):
+                    continue
+                if os.path.exists(os.path.join(entry.path, profile_name)):
+                    index[unquote(entry.name[2:])] = entry.path
+                elif any(os.path.exists(os.path.join(entry.path, name)) for name in other_names):
+                    raise ValueError(
+                        f"{entry.path} is stored in another format; run "
+                        f"`python user_store.py convert --to {self.codec.name}` first"
+                    )
+        return index
+
+    def _shard(self, username, create=False):
+        with self._lock:
+            shard = self._shards.get(username)
+            if shard is None:
+                directory = self._index.get(username)
+                if directory is None:
+                    if not create:
+                        return None
+                    directory = _shard_dir(self.directory, username)
+                shard = UserShard(username, directory, self.codec)
+                self._shards[username] = shard
+            return shard
+
+    def _save_profile(self, shard):
+        self.coalescer.schedule(shard.username, shard.write_profile)
+
+    def user_exists(self, username):
+        return username in self._index
+
+    def get_user(self, username, with_transactions=True):
+        shard = self._shard(username)
+        if shard is None or shard.profile is None:
+            return None
+        with shard.lock:
+            record = copy.deepcopy(shard.profile)
+            position = copy.deepcopy(shard.position())
+        record["balance"] = position["balance"]
+        record["portfolio"] = position["portfolio"]
+        record["lots"] = position["lots"]
+        if with_transactions:
+            record["transactions"] = shard.transactions()
+        return record
+
+    def query_transactions(self, username, symbol=None, action=None, start=None, end=None, descending=True, offset=0, limit=50):
+        shard = self._shard(username)
+        if shard is None:
+            return [], 0
+        index = shard.index
+        with shard.lock:
+            return index.query(symbol, action, start, end, descending, offset, limit)
+
+    def transaction_symbols(self, username):
+        shard = self._shard(username)
+        if shard is None:
+            return []
+        index = shard.index
+        with shard.lock:
+            return index.symbols()
+
+    def authenticate(self, username, password):
+        shard = self._shard(username)
+        if shard is None or shard.profile is None or shard.profile["password"] != password:
+            return None
+        return self.get_user(username, with_transactions=False)
+
+    def usernames(self):
+        return list(self._index)
+
+    def load_all(self):
+        return {username: self.get_user(username) for username in self.usernames()}
+
+    def load_holdings(self):
+        holdings = {}
+        for username in self.usernames():
+            shard = self._shard(username)
+            with shard.lock:
+                holdings[username] = {
+                    "watchlist": list(shard.profile["watchlist"]),
+                    "portfolio": copy.deepcopy(shard.position()["portfolio"])
+                }
+        return holdings
+
+    # Registration is written through immediately rather than debounced
+    def create_user(self, username, record):
+        with self._lock:
+            if username in self._index:
+                return False
+            self._index[username] = _shard_dir(self.directory, username)
+        shard = self._shard(username, create=True)
+        with shard.lock:
+            shard.profile = _profile_of(record)
+            self._open(shard, record)
+        shard.write_profile()
+        return True
+
+    def _open(self, shard, record):
+        shard._index = None
+        event = {
+            "type": "open", "user": shard.username,
+            "balance": record.get("balance", 0.0),
+            "portfolio": record.get("portfolio", {}),
+            "transactions": [shard.codec.pack_transaction(t) for t in record.get("transactions", [])]
+        }
+        # Without lot state (users.json records) the reducer builds it from the transactions
+        if record.get("lots"):
+            event["lots"] = record["lots"]
+        shard.journal.append(event)
+
+    # Validate against the current position, then append. Returns False if funds or shares are short.
+    def record_trade(self, username, transaction):
+        shard = self._shard(username)
+        if shard is None:
+            return False
+        with shard.lock:
+            # Validation only needs cash and shares, not a copy of the lots
+            position = shard.position()
+            if not apply_trade({"balance": position["balance"], "portfolio": copy.deepcopy(position["portfolio"])}, transaction):
+                return False
+            transaction = _reconcile_lots(position["lots"], transaction)
+            event = {"type": "trade", "user": username, "transaction": shard.codec.pack_transaction(transaction)}
+            record = shard.journal.append(event, durable=False)
+            if shard._index is not None:
+                shard._index.add(dict(transaction))
+        shard.journal.sync(record["seq"])
+        return True
+
+    def add_to_watchlist(self, username, symbol):
+        shard = self._shard(username)
+        if shard is None:
+            return False
+        with shard.lock:
+            if symbol in shard.profile["watchlist"]:
+                return False
+            shard.profile["watchlist"].append(symbol)
+        self._save_profile(shard)
+        return True
+
+    def set_price_alerts(self, username, alerts):
+        shard = self._shard(username)
+        if shard is None:
+            return False
+        with shard.lock:
+            shard.profile["price_alerts"] = list(alerts)
+        self._save_profile(shard)
+        return True
+
+    def update_profile(self, username, email=None, password=None):
+        shard = self._shard(username)
+        if shard is None:
+            return
+        with shard.lock:
+            if email:
+                shard.profile["email"] = email
+            if password:
+                shard.profile["password"] = password
+        self._save_profile(shard)
+
+    # Bulk replace for imports and tools: only users whose profile or position actually changed are written
+    def save_all(self, users):
+        for username, record in users.items():
+            if not self.user_exists(username):
+                self.create_user(username, record)
+                continue
+            shard = self._shard(username)
+            profile = _profile_of(record)
+            with shard.lock:
+                profile_changed = profile != shard.profile
+                if profile_changed:
+                    shard.profile = profile
+                position = shard.position()
+                if record.get("balance", 0.0) != position["balance"] or record.get("portfolio", {}) != position["portfolio"]:
+                    self._open(shard, record)
+            if profile_changed:
+                self._save_profile(shard)
+
+    def is_empty(self):
+        return not self._index
+
+    def flush(self):
+        self.coalescer.flush()
+
+# One-shot import of a legacy users.json; existing usernames are left alone
+def migrate_from_json(store, json_path=LEGACY_USER_FILE):
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r") as f:
+        users = json.load(f)
+    migrated = 0
+    for username, record in users.items():
+        if store.create_user(username, record):
+            migrated += 1
+    return migrated
+
+# Rewrite every shard of a file store from one format to another: profile,
+# full journal (same events, same order) and a fresh snapshot. The source
+# files are removed once a shard has been rewritten. json and orjson share one
+# on-disk layout, so switching between them needs no conversion.
+def convert_store(directory, source_name, target_name):
+    source, target = get_codec(source_name), get_codec(target_name)
+    if (source.extension, source.log_extension) == (target.extension, target.log_extension):
+        return 0
+    converted = 0
+    for bucket in os.scandir(directory):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if not entry.name.startswith("u_"):
+                continue
+            old = UserShard(unquote(entry.name[2:]), entry.path, source)
+            if old.profile is None:
+                continue
+            for name in ("profile" + target.extension, "journal" + target.log_extension, "snapshot" + target.extension):
+                if os.path.exists(os.path.join(entry.path, name)):
+                    os.remove(os.path.join(entry.path, name))  # left over from an interrupted conversion
+            new = UserShard(old.username, entry.path, target)
+            new.profile = old.profile
+            for event in old.journal.events():
+                event = dict(event)
+                event.pop("seq", None)
+                if event["type"] == "trade":
+                    event["transaction"] = target.pack_transaction(source.unpack_transaction(event["transaction"]))
+                elif event["type"] == "open":
+                    event["transactions"] = [target.pack_transaction(source.unpack_transaction(t)) for t in event.get("transactions", [])]
+                new.journal.append(event, durable=False)
+            new.journal.snapshot()
+            new.write_profile()
+            for path in (old.profile_path, old.journal.log_path, old.journal.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            converted += 1
+    return converted
+
+_store = None
+_store_lock = threading.Lock()
+
+def open_user_store(backend=USER_STORE_BACKEND):
+    if backend == "file":
+        store = ShardedUserStore(USER_DIR)
+        atexit.register(store.flush)
+        return store
+    return SQLiteUserStore(USER_DB_FILE)
+
+# Process-wide store, chosen by TRADESENSE_USER_STORE. An empty store is seeded
+# from users.json on first open.
+def get_user_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_user_store()
+            if _store.is_empty():
+                migrate_from_json(_store, LEGACY_USER_FILE)
+        return _store
+
+# CLI: python user_store.py migrate [--json users.json] [--backend sqlite|file]
+#      python user_store.py convert --from json --to msgpack   (file store)
+def main():
+    parser = argparse.ArgumentParser(description="TradeRiser user store tools.")
+    parser.add_argument("command", choices=["migrate", "snapshot", "convert"])
+    parser.add_argument("--json", default=LEGACY_USER_FILE, help="Legacy users.json to import")
+    parser.add_argument("--backend", default=USER_STORE_BACKEND, choices=["sqlite", "file"])
+    parser.add_argument("--from", dest="source", default="json", choices=list(CODECS), help="Current file store format")
+    parser.add_argument("--to", dest="target", default=USER_FORMAT, choices=list(CODECS), help="New file store format")
+    args = parser.parse_args()
+    if args.command == "convert":
+        converted = convert_store(USER_DIR, args.source, args.target)
+        print(f"Converted {converted} user shards in {USER_DIR} from {args.source} to {args.target}")
+        print(f"Set TRADESENSE_USER_FORMAT={args.target} to use them")
+        return
+    store = open_user_store(args.backend)
+    if args.command == "migrate":
+        migrated = migrate_from_json(store, args.json)
+        print(f"Migrated {migrated} users from {args.json} into the {args.backend} store")
+    elif args.backend == "file":
+        for username in store.usernames():
+            store._shard(username).journal.snapshot()
+        print(f"Snapshots written for {len(store.usernames())} users")
+
+if __name__ == "__main__":
+    main()
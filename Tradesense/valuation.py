@@ -0,0 +1,39 @@
+import numpy as np
+
+# Portfolio dict ({symbol: {"quantity", "avg_price"}}) as aligned arrays
+def position_arrays(portfolio):
+    symbols = list(portfolio)
+    quantities = np.fromiter((portfolio[s]["quantity"] for s in symbols), dtype=np.float64, count=len(symbols))
+    avg_prices = np.fromiter((portfolio[s]["avg_price"] for s in symbols), dtype=np.float64, count=len(symbols))
+    return symbols, quantities, avg_prices
+
+# One price per symbol from a bulk quote dict; `overrides` (e.g. live chart
+# prices) take precedence. Missing prices are 0.
+def price_vector(symbols, quotes, overrides=None):
+    overrides = overrides or {}
+    return np.fromiter(
+        (overrides.get(s, quotes.get(s, 0.0)) for s in symbols), dtype=np.float64, count=len(symbols)
+    )
+
+# Value a set of positions in one pass over numpy arrays.
+# Weights are each position's share of the invested value. Exposure is each
+# position's share of total equity (positions plus cash).
+def value_positions(quantities, avg_prices, prices, cash=0.0):
+    values = quantities * prices
+    cost = quantities * avg_prices
+    pnl = values - cost
+    invested = values.sum()
+    equity = invested + cash
+    weights = values / invested if invested else np.zeros_like(values)
+    exposure = values / equity if equity else np.zeros_like(values)
+    return {
+        "values": values,
+        "cost": cost,
+        "pnl": pnl,
+        "weights": weights,
+        "exposure": exposure,
+        "invested": float(invested),
+        "equity": float(equity),
+        "gross_exposure": float(np.abs(values).sum() / equity) if equity else 0.0,
+        "net_pnl": float(pnl.sum())
+    }